@@ -0,0 +1,268 @@
+import asyncio
+import random
+import re
+import secrets
+import threading
+import time
+from pathlib import Path
+
+from aiohttp import web
+from django.utils.timezone import localtime, now
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+
+AUTH_PATH = "/uk/accounts/ajax/auth"
+LISTING_PATH = "/uk/listings/all"
+BID_PATH = "/uk/voodoo1domainlisting/bid"
+SESSION_COOKIE = "sessionid"
+AUTH_ID = 4242
+PAGE_SIZE = 100
+MIN_BID = 900
+BID_STEP = 100
+MAX_BID = 50000
+BID_ACCEPTED_TEXT = "Вашу заявку успішно збережено"
+
+LISTING_ROW = '''            <tr style="cursor: pointer;" data-id="{domain_id}">
+                <td>
+                    <div class="fqdn">{name}</div>
+                    <div class="small text-muted">Реєстратор: ukrnames</div>
+                </td>
+                <td class="text-center">{price}</td>
+                <td class="text-center">≈ {expiration}</td>
+                <td class="text-center"><span class="badge">{bids}</span></td>
+            </tr>
+'''
+LOGIN_FORM = '''<!DOCTYPE html>
+<html lang="uk"><body>
+<form method="post" action="/uk/accounts/login">
+    <input type="text" name="auth_login"><input type="password" name="auth_password">
+</form>
+</body></html>
+'''
+SUCCESS_ALERT = f'<div class="alert alert-success">{BID_ACCEPTED_TEXT}</div>\n    <div class="panel panel-default">'
+
+
+def format_amount(value):
+    """1200 -> '1&nbsp;200' like the bid input on Voodoo."""
+    return f"{value:,}".replace(",", "&nbsp;")
+
+
+class Auction:
+    def __init__(self, domain_id, name, expiration_date):
+        self.domain_id = domain_id
+        self.name = name
+        self.expiration_date = expiration_date
+        self.price = 0  # highest bid, 0 - no bids yet
+        self.bids = 0
+        self.our_bid = None
+        self.we_lead = False
+        self.outbid_at = None  # monotonic time a competitor took the lead from us
+
+    def is_open(self, current_time):
+        return current_time < self.expiration_date
+
+    def required_bid(self):
+        """Minimum accepted bid, our own leading bid needs no raise."""
+        if self.we_lead:
+            return self.our_bid
+        return self.price + BID_STEP if self.price else MIN_BID
+
+
+class VoodooStandin:
+    """
+    Offline stand-in for the parts of voodoo.domains the bidder uses: the auth JSON endpoint,
+    paginated listings and bid pages, rendered from the saved markup in benchmarks/fixtures.
+
+    Competitors outbid us `competitor_rate` times per auction per minute on average, up to their
+    own random limit. Every response is delayed by about `latency` seconds.
+    """
+
+    def __init__(self, domains, latency=0.05, competitor_rate=2.0, session_ttl=None):
+        self.auctions = {domain_id: Auction(domain_id, name, expiration) for domain_id, name, expiration in domains}
+        self.order = sorted(self.auctions.values(), key=lambda auction: auction.expiration_date)
+        self.competitor_limits = {domain_id: random.randint(MIN_BID, MAX_BID // 5) for domain_id in self.auctions}
+        self.latency = latency
+        self.competitor_rate = competitor_rate
+        self.session_ttl = session_ttl
+        self.sessions = {}  # token -> created (monotonic)
+
+        self.time_to_bid = []  # seconds from being outbid to our next accepted bid
+        self.requests = 0
+        self.bids_accepted = 0
+        self.logins = 0
+
+        listing = (FIXTURES_DIR / "listing_page.html").read_text(encoding="utf-8")
+        head, rest = listing.split("<tbody>\n", 1)
+        _, tail = rest.split("        </tbody>", 1)
+        self.listing_head = head + "<tbody>\n"
+        self.listing_tail = "        </tbody>" + tail
+        self.bid_page = (FIXTURES_DIR / "bid_page.html").read_text(encoding="utf-8")
+        self.ended_page = (FIXTURES_DIR / "bid_page_ended.html").read_text(encoding="utf-8")
+
+        self.thread = None
+        self.loop = None
+        self.runner = None
+
+    # HTTP
+
+    def app(self):
+        app = web.Application(middlewares=[self.delay])
+        app.router.add_route("*", AUTH_PATH, self.auth)
+        app.router.add_get(LISTING_PATH, self.listing)
+        app.router.add_route("*", BID_PATH, self.bid)
+        app.on_startup.append(self.start_competitors)
+        app.on_cleanup.append(self.stop_competitors)
+        return app
+
+    @web.middleware
+    async def delay(self, request, handler):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+        return await handler(request)
+
+    def is_authenticated(self, request):
+        created = self.sessions.get(request.cookies.get(SESSION_COOKIE))
+        if created is None:
+            return False
+        return self.session_ttl is None or time.monotonic() - created < self.session_ttl
+
+    async def auth(self, request):
+        if request.method == "POST":
+            data = await request.post()
+            if not data.get("auth_login") or not data.get("auth_password"):
+                return web.json_response({"auth_id": 0})
+            token = secrets.token_hex(16)
+            self.sessions[token] = time.monotonic()
+            self.logins += 1
+            response = web.json_response({"auth_id": AUTH_ID})
+            response.set_cookie(SESSION_COOKIE, token, path="/")
+            return response
+        return web.json_response({"auth_id": AUTH_ID if self.is_authenticated(request) else 0})
+
+    async def listing(self, request):
+        if not self.is_authenticated(request):
+            return web.Response(text=LOGIN_FORM, content_type="text/html")
+
+        total_pages = max(1, -(-len(self.order) // PAGE_SIZE))
+        page = min(max(int(request.query.get("page", 1)), 1), total_pages)
+        rows = "".join(
+            LISTING_ROW.format(
+                domain_id=auction.domain_id,
+                name=auction.name,
+                price=auction.price or MIN_BID,
+                expiration=localtime(auction.expiration_date).strftime("%d.%m.%Y %H:%M:%S"),
+                bids=auction.bids,
+            )
+            for auction in self.order[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+        )
+        html = self.listing_head + rows + self.listing_tail
+        html = re.sub(r'<ul class="pagination">.*?</ul>', self.pagination(request.query.get("day", ""), total_pages),
+                      html, count=1, flags=re.S)
+        return web.Response(text=html, content_type="text/html")
+
+    def pagination(self, day, total_pages):
+        links = "".join(
+            f'        <li><a href="{LISTING_PATH}?day={day}&amp;page={page}">{page}</a></li>\n'
+            for page in range(1, total_pages + 1)
+        )
+        return f'<ul class="pagination">\n{links}    </ul>'
+
+    async def bid(self, request):
+        if not self.is_authenticated(request):
+            return web.Response(text=LOGIN_FORM, content_type="text/html")
+
+        try:
+            auction = self.auctions[int(request.query["backorder_domain_id"])]
+        except (KeyError, ValueError):
+            raise web.HTTPNotFound()
+
+        if not auction.is_open(now()):
+            return web.Response(text=self.ended_page, content_type="text/html")
+
+        accepted = False
+        if request.method == "POST":
+            data = await request.post()
+            try:
+                amount = int(data.get("backorder_sum", ""))
+            except ValueError:
+                amount = 0
+            if amount >= auction.required_bid():
+                self.accept_bid(auction, amount)
+                accepted = True
+
+        return web.Response(text=self.render_bid_page(auction, accepted), content_type="text/html")
+
+    def render_bid_page(self, auction, accepted=False):
+        html = self.bid_page.replace("backorder_domain_id=21246060", f"backorder_domain_id={auction.domain_id}")
+        html = html.replace('value="1&nbsp;200"', f'value="{format_amount(auction.our_bid) if auction.our_bid else ""}"')
+        html = html.replace("Ставка від 1300 до 50000 грн", f"Ставка від {auction.required_bid()} до {MAX_BID} грн")
+        if accepted:
+            html = html.replace('<div class="panel panel-default">', SUCCESS_ALERT, 1)
+        return html
+
+    # auction state
+
+    def accept_bid(self, auction, amount):
+        auction.price = auction.our_bid = amount
+        auction.bids += 1
+        auction.we_lead = True
+        self.bids_accepted += 1
+        if auction.outbid_at is not None:
+            self.time_to_bid.append(time.monotonic() - auction.outbid_at)
+            auction.outbid_at = None
+
+    async def start_competitors(self, app):
+        app["competitors"] = asyncio.create_task(self.competitors())
+
+    async def stop_competitors(self, app):
+        app["competitors"].cancel()
+
+    async def competitors(self):
+        """Once a second, outbid us on some of the open auctions we lead."""
+        chance = self.competitor_rate / 60
+        while True:
+            await asyncio.sleep(1)
+            current_time = now()
+            for auction in self.order:
+                if not auction.we_lead or not auction.is_open(current_time) or random.random() >= chance:
+                    continue
+                amount = auction.price + BID_STEP
+                if amount > self.competitor_limits[auction.domain_id]:
+                    continue
+                auction.price = amount
+                auction.bids += 1
+                auction.we_lead = False
+                auction.outbid_at = time.monotonic()
+
+    def results(self):
+        """(won, missed) auctions among the ended ones: missed - ended without us leading."""
+        current_time = now()
+        ended = [auction for auction in self.order if not auction.is_open(current_time)]
+        won = sum(1 for auction in ended if auction.we_lead)
+        return won, len(ended) - won
+
+    # running
+
+    def start(self, host="localhost", port=8765):
+        """Serve in a background thread, returns once the port is open."""
+        started = threading.Event()
+
+        def serve():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self.runner = web.AppRunner(self.app())
+            self.loop.run_until_complete(self.runner.setup())
+            self.loop.run_until_complete(web.TCPSite(self.runner, host, port).start())
+            started.set()
+            self.loop.run_forever()
+            self.loop.run_until_complete(self.runner.cleanup())
+
+        self.thread = threading.Thread(target=serve, name="voodoo-standin", daemon=True)
+        self.thread.start()
+        started.wait(timeout=10)
+
+    def stop(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=10)
@@ -1,103 +1,395 @@
 import asyncio
+import json
+import os
+import random
+from collections import Counter
+from datetime import datetime
+
 import aiohttp
 from decouple import config
 
 from asgiref.sync import sync_to_async
 from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils.timezone import now
 
 from autobidder_app.models import Domain, AhrefsData
+from autobidder_app.utils.ahrefs_balance import BALANCE_RESERVE, check_api_limit, rows_left, spend_units
+from autobidder_app.utils.ahrefs_cache import cache_stats, load_responses, save_responses
+from autobidder_app.utils.domain_prefilter import prefilter_reason
 from autobidder_app.utils.logger import setup_logger
+from autobidder_app.utils.rate_limit import SharedRateLimiter
 
 # loggins
 logger = setup_logger("ahrefs_data", log_directory="logs/ahrefs", days=7)
 
+AHREFS_API_URL = "https://apiv2.ahrefs.com/"
+AHREFS_CONCURRENCY = config("AHREFS_CONCURRENCY", default=20, cast=int)  # open requests at most
+AHREFS_REQUESTS_PER_SECOND = config("AHREFS_REQUESTS_PER_SECOND", default=10, cast=float)  # api quota
+# the quota is shared through this file by the ahrefs_data command and the ahrefs-test lookups
+AHREFS_RATE_FILE = config("AHREFS_RATE_FILE", default=".ahrefs_rate")
+AHREFS_TIMEOUT = 60
+AHREFS_MAX_RETRIES = 4
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+BACKOFF_BASE, BACKOFF_MAX = 1, 30  # seconds
+# API units per request: both endpoints return a single row
+ENDPOINT_UNITS = {"domain_rating": 1, "metrics_extended": 1}
+UNITS_PER_DOMAIN = sum(ENDPOINT_UNITS.values())
+
+# AhrefsData field -> metrics_extended key
+METRICS_FIELDS = {
+    "backlinks": "backlinks",
+    "ref_pages": "refpages",
+    "pages": "pages",
+    "valid_pages": "valid_pages",
+    "text_links": "text",
+    "image_links": "image",
+    "nofollow_links": "nofollow",
+    "ugc_links": "ugc",
+    "sponsored_links": "sponsored",
+    "dofollow_links": "dofollow",
+    "redirect_links": "redirect",
+    "canonical_links": "canonical",
+    "gov_links": "gov",
+    "edu_links": "edu",
+    "rss_links": "rss",
+    "alternate_links": "alternate",
+    "html_pages": "html_pages",
+    "internal_links": "links_internal",
+    "external_links": "links_external",
+    "ref_domains": "refdomains",
+    "ref_class_c": "refclass_c",
+    "ref_ips": "refips",
+    "linked_root_domains": "linked_root_domains",
+}
+AHREFS_DATA_FIELDS = ["domain_rating", "ahrefs_top", *METRICS_FIELDS]
+AHREFS_WRITE_BATCH = 500
+AHREFS_CHUNK_SIZE = config("AHREFS_CHUNK_SIZE", default=200, cast=int)  # domains fetched and committed together
+CHECKPOINT_FILE = config("AHREFS_CHECKPOINT_FILE", default=".ahrefs_checkpoint.json")
+
 
 class AhrefsFetcher:
-    def __init__(self):
+    """
+    Fetches Ahrefs metrics for many domains.
+
+    One semaphore is shared by every request of the fetcher, so a large batch never has
+    more than `concurrency` requests open. The `requests_per_second` limit is shared by all
+    fetchers of all processes through AHREFS_RATE_FILE. Use one fetcher per event loop.
+
+    Responses are cached per (endpoint, domain), see utils/ahrefs_cache.py, a cached
+    response is used without any request.
+    """
+
+    def __init__(self, concurrency=AHREFS_CONCURRENCY, requests_per_second=AHREFS_REQUESTS_PER_SECOND, use_cache=True):
         self.api_token = config("AHREFS_API")
+        self.concurrency = concurrency
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.rate_limiter = SharedRateLimiter(AHREFS_RATE_FILE, requests_per_second)
+        self.use_cache = use_cache
+        self.cached = {}  # (endpoint, domain) -> (pk, response) for the current fetch_all
+        self.fresh = {}  # (endpoint, domain) -> (units, response) fetched by the current fetch_all
+        self.hit_pks = []
+        self.cache_hits = 0
+        self.units_saved = 0
+        self.units_spent = 0
 
+    def create_session(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency,
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+        )
+        return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=AHREFS_TIMEOUT))
 
-    async def fetch_data(self, session, domain):
-        async with asyncio.Semaphore(100):
+    async def get_json(self, session, url):
+        """
+        Rate limited GET, returns (status, json or None).
+
+        429/5xx and network errors are retried with full-jitter exponential backoff,
+        the wait happens outside of the semaphore so other requests keep going.
+        """
+        for attempt in range(AHREFS_MAX_RETRIES + 1):
+            retry_after = None
             try:
-                logger.info(f"Getting data for domain: {domain}")
-
-                domain_rating_url = f"https://apiv2.ahrefs.com/?token={self.api_token}&target={domain}&output=json&from=domain_rating&mode=domain"
-                async with session.get(domain_rating_url) as response:
-                    if response.status != 200:
-                        raise Exception(f"Failed to get domain rating (status: {response.status})")
-                    domain_rating_json = await response.json()
-                    domain_data = domain_rating_json.get("domain", {})
-                    domain_rating = int(float(domain_data.get("domain_rating", 0.0)))
-                    ahrefs_top = int(domain_data.get("ahrefs_top", 0))
-
-                metrics_url = f"https://apiv2.ahrefs.com/?token={self.api_token}&target={domain}&limit=1000&output=json&from=metrics_extended&mode=subdomains"
-                async with session.get(metrics_url) as response:
-                    if response.status != 200:
-                        raise Exception(f"Failed to get metrics (status: {response.status})")
-                    metrics_json = await response.json()
-                    metrics = metrics_json.get("metrics", {})
-
-                return {
-                    "domain_rating": domain_rating,
-                    "ahrefs_top": ahrefs_top,
-                    "backlinks": metrics.get("backlinks", 0),
-                    "ref_pages": metrics.get("refpages", 0),
-                    "pages": metrics.get("pages", 0),
-                    "valid_pages": metrics.get("valid_pages", 0),
-                    "text_links": metrics.get("text", 0),
-                    "image_links": metrics.get("image", 0),
-                    "nofollow_links": metrics.get("nofollow", 0),
-                    "ugc_links": metrics.get("ugc", 0),
-                    "sponsored_links": metrics.get("sponsored", 0),
-                    "dofollow_links": metrics.get("dofollow", 0),
-                    "redirect_links": metrics.get("redirect", 0),
-                    "canonical_links": metrics.get("canonical", 0),
-                    "gov_links": metrics.get("gov", 0),
-                    "edu_links": metrics.get("edu", 0),
-                    "rss_links": metrics.get("rss", 0),
-                    "alternate_links": metrics.get("alternate", 0),
-                    "html_pages": metrics.get("html_pages", 0),
-                    "internal_links": metrics.get("links_internal", 0),
-                    "external_links": metrics.get("links_external", 0),
-                    "ref_domains": metrics.get("refdomains", 0),
-                    "ref_class_c": metrics.get("refclass_c", 0),
-                    "ref_ips": metrics.get("refips", 0),
-                    "linked_root_domains": metrics.get("linked_root_domains", 0),
-                }
-            except Exception as e:
-                logger.error(f"Error fetching data for domain {domain}: {e}")
-                return None
+                async with self.semaphore:
+                    await self.rate_limiter.acquire()
+                    async with session.get(url) as response:
+                        status = response.status
+                        if status == 200:
+                            return status, await response.json()
+                        retry_after = response.headers.get("Retry-After")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status = None
+                logger.warning(f"Ahrefs request failed: {e.__class__.__name__} {e}")
+
+            if (status is not None and status not in RETRY_STATUSES) or attempt == AHREFS_MAX_RETRIES:
+                return status, None
+
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, int(retry_after))
+            logger.info(f"Ahrefs answered {status}, retry {attempt + 1}/{AHREFS_MAX_RETRIES} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def get_endpoint(self, session, endpoint, domain, url):
+        """get_json through the response cache."""
+        key = (endpoint, domain)
+        if key in self.cached:
+            pk, response = self.cached[key]
+            self.hit_pks.append(pk)
+            self.cache_hits += 1
+            self.units_saved += ENDPOINT_UNITS[endpoint]
+            return 200, response
+
+        status, response = await self.get_json(session, url)
+        if status == 200:
+            self.units_spent += ENDPOINT_UNITS[endpoint]
+            if self.use_cache:
+                self.fresh[key] = (ENDPOINT_UNITS[endpoint], response)
+        return status, response
+
+    async def fetch_domain_rating(self, session, domain):
+        domain_rating_url = f"{AHREFS_API_URL}?token={self.api_token}&target={domain}&output=json&from=domain_rating&mode=domain"
+        try:
+            status, domain_rating_json = await self.get_endpoint(session, "domain_rating", domain, domain_rating_url)
+            if status != 200:
+                raise Exception(f"Failed to get domain rating (status: {status})")
+            domain_data = domain_rating_json.get("domain", {})
+            return {
+                "domain_rating": int(float(domain_data.get("domain_rating", 0.0))),
+                "ahrefs_top": int(domain_data.get("ahrefs_top", 0)),
+            }
+        except Exception as e:
+            logger.error(f"Error fetching domain rating for domain {domain}: {e}")
+            return None
+
+    async def fetch_metrics(self, session, domain):
+        metrics_url = f"{AHREFS_API_URL}?token={self.api_token}&target={domain}&limit=1000&output=json&from=metrics_extended&mode=subdomains"
+        try:
+            status, metrics_json = await self.get_endpoint(session, "metrics_extended", domain, metrics_url)
+            if status != 200:
+                raise Exception(f"Failed to get metrics (status: {status})")
+            metrics = metrics_json.get("metrics", {})
+            return {field: metrics.get(api_field, 0) for field, api_field in METRICS_FIELDS.items()}
+        except Exception as e:
+            logger.error(f"Error fetching metrics for domain {domain}: {e}")
+            return None
+
+    async def fetch_data(self, session, domain):
+        """
+        Request both endpoints at once. A failed endpoint does not discard the other one,
+        its fields are missing from the result, see is_complete().
+        """
+        logger.info(f"Getting data for domain: {domain}")
+        domain_rating, metrics = await asyncio.gather(
+            self.fetch_domain_rating(session, domain),
+            self.fetch_metrics(session, domain),
+        )
+
+        if domain_rating is None and metrics is None:
+            return None
+        if domain_rating is None or metrics is None:
+            logger.warning(f"Partial data for domain {domain}: {'metrics' if metrics is None else 'domain rating'} missing")
+        return {**(domain_rating or {}), **(metrics or {})}
 
     async def fetch_all(self, domains):
-        async with aiohttp.ClientSession() as session:
+        self.fresh, self.hit_pks = {}, []
+        self.cached = await sync_to_async(load_responses)(ENDPOINT_UNITS, domains) if self.use_cache else {}
+        hits_before, spent_before = self.cache_hits, self.units_spent
+
+        async with self.create_session() as session:
             tasks = [self.fetch_data(session, domain) for domain in domains]
-            return await asyncio.gather(*tasks)
+            results = await asyncio.gather(*tasks)
+
+        await sync_to_async(spend_units)(self.units_spent - spent_before)
+        if self.use_cache:
+            await sync_to_async(save_responses)(self.fresh, self.hit_pks)
+            if self.cache_hits > hits_before:
+                logger.info(f"Ahrefs cache: {self.cache_hits - hits_before} responses reused, "
+                            f"{self.units_saved} units saved by this fetcher")
+        return results
+
+
+def is_complete(data):
+    """True when every endpoint answered, a partial result must not be saved as zeros."""
+    return bool(data) and all(field in data for field in AHREFS_DATA_FIELDS)
 
 
 class AhrefsDataUpdater:
-    def __init__(self):
-        self.fetcher = AhrefsFetcher()
+    def __init__(self, use_cache=True):
+        self.fetcher = AhrefsFetcher(use_cache=use_cache)
+
+    async def update_ahrefs_data(self, chunk_size=AHREFS_CHUNK_SIZE, resume=True):
+        """
+        Enrich domains without Ahrefs data in chunks of `chunk_size`, nearest expiration first.
+        Domains whose auction already ended are skipped, and so are names rejected by
+        utils/domain_prefilter.py, before any request. Only complete results are saved, a domain
+        with a failed endpoint stays pending and its retry pays only for that endpoint (cache).
+
+        Every chunk is committed as soon as it is fetched and the position of its last domain
+        is saved to CHECKPOINT_FILE, so a restarted run first continues after it instead of
+        starting again with the domains it has just tried. Once past the last domain, a resumed
+        run wraps around to the pending domains up to the checkpoint: the ones that failed before
+        the interruption, new listings and domains whose expiration date moved earlier. A domain
+        is pending for as long as it has no AhrefsData, the checkpoint only changes the order.
+
+        A chunk is shrunk to what the Ahrefs balance can pay for, keeping BALANCE_RESERVE units,
+        and the run stops, keeping its checkpoint, once nothing more can be paid for.
+        """
+        checkpoint = self.load_checkpoint() if resume else None
+        if checkpoint is not None:
+            logger.info(f"Resuming after domain ID {checkpoint[1]} expiring {checkpoint[0]}.")
+        after, until = checkpoint, None
+
+        total_pending = await sync_to_async(self.pending_domains().count)()
+        logger.info(f"Found {total_pending} domains with open auctions to process.")
+
+        balance = await sync_to_async(check_api_limit)(max_age=0)
+        if rows_left(balance) is None:
+            logger.warning("Ahrefs balance is unknown, chunks are not limited by it.")
+        else:
+            logger.info(f"Ahrefs balance: {rows_left(balance)} units left, {total_pending * UNITS_PER_DOMAIN} needed at most.")
+
+        processed = saved = 0
+        skipped = Counter()
+        out_of_units = False
+        while True:
+            limit = await sync_to_async(self.affordable_domains)(chunk_size)
+            if limit == 0:
+                out_of_units = True
+                logger.error(f"Ahrefs balance is at the {BALANCE_RESERVE} units reserve, stopping. "
+                             f"The next run continues from the checkpoint.")
+                break
+            if limit < chunk_size:
+                logger.warning(f"Ahrefs balance covers {limit} more domains, shrinking the chunk.")
+
+            candidates = await sync_to_async(self.pending_chunk)(after, limit, until)
+            if not candidates:
+                if checkpoint is None or until is not None:
+                    break
+                logger.info("Wrapping around to pending domains up to the checkpoint.")
+                after, until = None, checkpoint
+                continue
+            after = candidates[-1][2], candidates[-1][0]
 
-    async def update_ahrefs_data(self):
-        domains_to_update = await sync_to_async(
-            lambda: list(Domain.objects.filter(ahrefs_data__isnull=True).values_list("name", flat=True))
-        )()
-        logger.info(f"Found {len(domains_to_update)} domains to process: {domains_to_update}")
+            chunk = []
+            for domain_id, domain_name, _ in candidates:
+                reason = prefilter_reason(domain_name)
+                if reason:
+                    skipped[reason] += 1
+                else:
+                    chunk.append((domain_id, domain_name))
+            if not chunk:
+                self.save_checkpoint(after)
+                continue
 
-        results = await self.fetcher.fetch_all(domains_to_update)
+            results = await self.fetcher.fetch_all([domain_name for _, domain_name in chunk])
 
-        ahrefs_data_objects = []
+            ahrefs_data_objects = [
+                AhrefsData(domain_id=domain_id, **data)
+                for (domain_id, _), data in zip(chunk, results)
+                if is_complete(data)
+            ]
+            incomplete = sum(1 for data in results if data and not is_complete(data))
+            if incomplete:
+                logger.warning(f"{incomplete} partial results not saved, the domains stay pending for the next run.")
+            if ahrefs_data_objects:
+                await sync_to_async(self.save_ahrefs_data)(ahrefs_data_objects)
 
-        for domain_name, data in zip(domains_to_update, results):
-            if data:
-                domain = await sync_to_async(Domain.objects.get)(name=domain_name)
-                ahrefs_data = AhrefsData(domain=domain, **data)
-                ahrefs_data_objects.append(ahrefs_data)
+            self.save_checkpoint(after)
+            processed += len(chunk)
+            saved += len(ahrefs_data_objects)
+            logger.info(f"Chunk done: {len(ahrefs_data_objects)}/{len(chunk)} saved, {processed} processed in total.")
 
-        if ahrefs_data_objects:
-            await sync_to_async(AhrefsData.objects.bulk_create)(ahrefs_data_objects)
-            logger.info(f"Successfully added {len(ahrefs_data_objects)} entries to the database.")
+        if not out_of_units:
+            self.clear_checkpoint()
+        logger.info(f"Successfully added {saved} entries to the database.")
+        if skipped:
+            logger.info(f"Skipped by prefilters: {sum(skipped.values())} domains {dict(skipped)}")
+        if self.fetcher.use_cache:
+            stats = await sync_to_async(cache_stats)()
+            logger.info(
+                f"Ahrefs cache: {self.fetcher.cache_hits} hits and {self.fetcher.units_saved} units saved this run, "
+                f"{stats['hits']} hits and {stats['units_saved']} units saved by {stats['entries']} cached responses"
+            )
+
+    @staticmethod
+    def affordable_domains(chunk_size):
+        """How many of `chunk_size` domains the cached balance pays for, cached responses are not counted."""
+        left = rows_left(check_api_limit())
+        if left is None:
+            return chunk_size
+        return max(0, min(chunk_size, (left - BALANCE_RESERVE) // UNITS_PER_DOMAIN))
+
+    @staticmethod
+    def pending_domains():
+        """Domains without Ahrefs data whose auction has not ended yet."""
+        return Domain.objects.filter(ahrefs_data__isnull=True, expiration_date__gt=now())
+
+    @classmethod
+    def pending_chunk(cls, after, limit, until=None):
+        return list(cls.pending_chunk_queryset(after, limit, until))
+
+    @classmethod
+    def pending_chunk_queryset(cls, after, limit, until=None):
+        """
+        Next `limit` pending (domain_id, name, expiration_date), nearest expiration first,
+        keyset-paginated by (expiration_date, domain_id) after the `after` pair and up to
+        the `until` pair included.
+        """
+        queryset = cls.pending_domains().order_by("expiration_date", "domain_id")
+        if after is not None:
+            expiration_date, domain_id = after
+            queryset = queryset.filter(
+                Q(expiration_date__gt=expiration_date) | Q(expiration_date=expiration_date, domain_id__gt=domain_id)
+            )
+        if until is not None:
+            expiration_date, domain_id = until
+            queryset = queryset.filter(
+                Q(expiration_date__lt=expiration_date) | Q(expiration_date=expiration_date, domain_id__lte=domain_id)
+            )
+        return queryset.values_list("domain_id", "name", "expiration_date")[:limit]
+
+    @staticmethod
+    def load_checkpoint():
+        """(expiration_date, domain_id) of the last processed domain, None without a checkpoint."""
+        try:
+            with open(CHECKPOINT_FILE) as f:
+                checkpoint = json.load(f)
+            return datetime.fromisoformat(checkpoint["last_expiration_date"]), checkpoint["last_domain_id"]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint: {e}")
+            return None
+
+    @staticmethod
+    def save_checkpoint(after):
+        expiration_date, domain_id = after
+        tmp_file = f"{CHECKPOINT_FILE}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump({
+                "last_expiration_date": expiration_date.isoformat(),
+                "last_domain_id": domain_id,
+                "updated_at": now().isoformat(),
+            }, f)
+        os.replace(tmp_file, CHECKPOINT_FILE)
+
+    @staticmethod
+    def clear_checkpoint():
+        if os.path.exists(CHECKPOINT_FILE):
+            os.remove(CHECKPOINT_FILE)
+
+    @staticmethod
+    def save_ahrefs_data(ahrefs_data_objects):
+        """Upsert in chunks of AHREFS_WRITE_BATCH rows, one statement per chunk."""
+        AhrefsData.objects.bulk_create(
+            ahrefs_data_objects,
+            batch_size=AHREFS_WRITE_BATCH,
+            update_conflicts=True,
+            unique_fields=["domain"],
+            update_fields=AHREFS_DATA_FIELDS,
+        )
 
     @staticmethod #not used
     def update_or_create_ahrefs_data(domain_name, data):
@@ -109,7 +401,15 @@ class AhrefsDataUpdater:
 
 class Command(BaseCommand):
 
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=AHREFS_CHUNK_SIZE,
+                            help="Domains fetched and committed per chunk.")
+        parser.add_argument("--restart", action="store_true",
+                            help="Ignore the checkpoint of an interrupted run.")
+        parser.add_argument("--no-cache", action="store_true",
+                            help="Fetch every domain from Ahrefs, ignoring cached responses.")
+
     def handle(self, *args, **kwargs):
-        updater = AhrefsDataUpdater()
-        asyncio.run(updater.update_ahrefs_data())
+        updater = AhrefsDataUpdater(use_cache=not kwargs["no_cache"])
+        asyncio.run(updater.update_ahrefs_data(chunk_size=kwargs["chunk_size"], resume=not kwargs["restart"]))
         logger.info("Ahrefs data update completed successfully!")
\ No newline at end of file
@@ -0,0 +1,52 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from autobidder_app.utils.html_extract import BeautifulSoupExtractor, LxmlExtractor, lxml_html
+
+FIXTURES_DIR = Path(__file__).resolve().parents[2] / "benchmarks" / "fixtures"
+
+# (fixture file, extractor method)
+CASES = [
+    ("listing_page.html", "parse_listing"),
+    ("bid_page.html", "parse_bid_page"),
+    ("bid_page_ended.html", "parse_bid_page"),
+]
+
+
+class Command(BaseCommand):
+    help = "Benchmark HTML extraction backends on saved Voodoo pages."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200, help="Runs per page and backend.")
+
+    def handle(self, *args, **kwargs):
+        iterations = kwargs["iterations"]
+        extractors = [BeautifulSoupExtractor()]
+        if lxml_html is not None:
+            extractors.append(LxmlExtractor())
+        else:
+            self.stdout.write(self.style.WARNING("lxml is not installed, only the fallback is measured."))
+
+        for file_name, method in CASES:
+            html = (FIXTURES_DIR / file_name).read_text(encoding="utf-8")
+            timings, results = {}, {}
+
+            for extractor in extractors:
+                parse = getattr(extractor, method)
+                results[extractor.name] = parse(html)
+
+                started = time.perf_counter()
+                for _ in range(iterations):
+                    parse(html)
+                timings[extractor.name] = (time.perf_counter() - started) / iterations * 1000
+
+            if len({repr(result) for result in results.values()}) > 1:
+                self.stdout.write(self.style.ERROR(f"{file_name}: backends disagree: {results}"))
+
+            baseline = timings[BeautifulSoupExtractor.name]
+            line = ", ".join(
+                f"{name} {ms:.3f} ms ({baseline / ms:.1f}x)" for name, ms in timings.items()
+            )
+            self.stdout.write(f"{file_name} [{method}]: {line}")
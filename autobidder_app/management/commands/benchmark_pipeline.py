@@ -0,0 +1,146 @@
+import time
+from collections import Counter
+from datetime import timedelta
+from urllib.parse import urlparse
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils.timezone import now
+
+from autobidder_app.benchmarks.voodoo_standin import PAGE_SIZE, VoodooStandin
+from autobidder_app.management.commands.make_bets import BID_CONCURRENCY, BID_RATE_PER_HOST, AsyncBetProcessor
+from autobidder_app.management.commands.voodoo_parse import run_parser
+from autobidder_app.models import Bet, BidAttempt, Domain
+from autobidder_app.utils.voodoo_log_in import VOODOO_BASE_URL
+
+BENCHMARK_ID_START = 1_500_000_000  # synthetic domains, written into a throwaway test database
+BENCHMARK_MAX_BET = 1_000_000  # above any competitor, so every lost auction is a missed deadline
+FIRST_EXPIRATION = timedelta(seconds=15)  # time for the parse step before auctions start ending
+LOCAL_HOSTS = ("localhost", "127.0.0.1")
+
+
+def percentile(values, percent):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, round(percent / 100 * (len(values) - 1)))]
+
+
+def format_seconds(value):
+    return "n/a" if value is None else f"{value:.2f}s"
+
+
+class Command(BaseCommand):
+    help = ("Run voodoo_parse -> make_bets against a local Voodoo stand-in and report throughput and time-to-bid. "
+            "Runs in a test database (test_<name>), the configured database is not touched.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--domains", type=int, default=2000, help="Auctions served by the stand-in.")
+        parser.add_argument("--window", type=int, default=120,
+                            help="Seconds over which the auctions end (after a short parse phase).")
+        parser.add_argument("--latency", type=int, default=50, help="Average stand-in response time, ms.")
+        parser.add_argument("--competitor-rate", type=float, default=2.0,
+                            help="Competitor bids per auction per minute.")
+        parser.add_argument("--concurrency", type=int, default=BID_CONCURRENCY,
+                            help="How many domains are checked at the same time.")
+        parser.add_argument("--rate", type=float, default=BID_RATE_PER_HOST,
+                            help="Max requests per second to one host (0 - no limit).")
+        parser.add_argument("--keepdb", action="store_true",
+                            help="Keep the test database with the synthetic domains, bets and history.")
+
+    def handle(self, *args, **kwargs):
+        base_url = urlparse(VOODOO_BASE_URL)
+        if base_url.hostname not in LOCAL_HOSTS or not base_url.port:
+            raise CommandError(
+                "VOODOO_BASE_URL must point to the local stand-in, e.g. VOODOO_BASE_URL=http://localhost:8765"
+            )
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=kwargs["keepdb"])
+        try:
+            self.benchmark(base_url, kwargs)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=kwargs["keepdb"])
+            teardown_test_environment()
+
+    def benchmark(self, base_url, kwargs):
+        if Domain.objects.filter(domain_id__gte=BENCHMARK_ID_START).exists():
+            raise CommandError("The kept test database has synthetic domains of a previous run, run without --keepdb.")
+
+        first_expiration = now() + FIRST_EXPIRATION
+        step = timedelta(seconds=kwargs["window"]) / max(kwargs["domains"], 1)
+        domains = [
+            (BENCHMARK_ID_START + i, f"bench-{i}.com.ua", (first_expiration + step * i).replace(microsecond=0))
+            for i in range(kwargs["domains"])
+        ]
+        standin = VoodooStandin(domains, latency=kwargs["latency"] / 1000, competitor_rate=kwargs["competitor_rate"])
+        standin.start(base_url.hostname, base_url.port)
+
+        try:
+            self.run_parse(standin, domains)
+            self.run_bidding(standin, domains, kwargs["concurrency"], kwargs["rate"])
+            self.report(standin)
+        finally:
+            standin.stop()
+
+    def run_parse(self, standin, domains):
+        started = time.perf_counter()
+        result = run_parser()
+        elapsed = time.perf_counter() - started
+        if result["status"] != "success":
+            raise CommandError(f"voodoo_parse failed: {result['message']}")
+
+        parsed = Domain.objects.filter(domain_id__gte=BENCHMARK_ID_START).count()
+        pages = -(-len(domains) // PAGE_SIZE)
+        self.stdout.write(
+            f"Parse: {parsed}/{len(domains)} domains, {pages} pages in {elapsed:.2f}s "
+            f"({parsed / elapsed:.0f} domains/s)"
+        )
+
+        Bet.objects.bulk_create(
+            [
+                Bet(domain_id=domain_id, expiration_date=expiration_date, max_bet=BENCHMARK_MAX_BET)
+                for domain_id, expiration_date in Domain.objects.filter(
+                    domain_id__gte=BENCHMARK_ID_START
+                ).values_list("domain_id", "expiration_date")
+            ],
+            batch_size=1000,
+        )
+
+    def run_bidding(self, standin, domains, concurrency, rate):
+        """make_bets rounds back to back, like a cron job without the pause, until every auction ended."""
+        deadline = domains[-1][2] + timedelta(seconds=2)
+        started = time.perf_counter()
+        rounds = checks = 0
+
+        while now() < deadline and Bet.objects.filter(domain_id__gte=BENCHMARK_ID_START).exists():
+            processor = AsyncBetProcessor(concurrency=concurrency, rate_per_host=rate)
+            processor.bets = processor.bets.filter(domain_id__gte=BENCHMARK_ID_START)
+            processor.run()
+            rounds += 1
+            checks += len(processor.latencies)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Bidding: {rounds} rounds, {checks} checks in {elapsed:.1f}s "
+            f"({checks / elapsed:.0f} checks/s), {standin.bids_accepted} bids accepted"
+        )
+
+    def report(self, standin):
+        waits = standin.time_to_bid
+        self.stdout.write(
+            f"Time to bid after being outbid: p50 {format_seconds(percentile(waits, 50))}, "
+            f"p99 {format_seconds(percentile(waits, 99))} (n={len(waits)})"
+        )
+
+        won, missed = standin.results()
+        style = self.style.ERROR if missed else self.style.SUCCESS
+        self.stdout.write(style(f"Auctions: {won + missed} ended, {won} won, {missed} missed deadlines"))
+
+        results = Counter(
+            BidAttempt.objects.filter(domain_id__gte=BENCHMARK_ID_START).values_list("result", flat=True)
+        )
+        self.stdout.write(f"Checks by result: {dict(results.most_common())}")
+        self.stdout.write(f"Stand-in: {standin.requests} requests, {standin.logins} login(s)")
+
@@ -0,0 +1,203 @@
+import asyncio
+import heapq
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils.timezone import now
+
+from autobidder_app.management.commands.make_bets import (
+    AsyncBetProcessor, BID_CONCURRENCY, BID_RATE_PER_HOST, TIME_BEFORE_EXPIRATION
+)
+from autobidder_app.models import Bet
+from autobidder_app.utils.logger import setup_logger
+from autobidder_app.utils.notification import NotificationDispatcher
+
+# loggins
+logger = setup_logger("bid_scheduler", log_directory="logs/make_bets", days=7)
+
+# (time left until expiration, how often to check), fastest first
+CHECK_CADENCE = [
+    (timedelta(minutes=2), timedelta(seconds=5)),
+    (timedelta(minutes=10), timedelta(minutes=1)),
+    (TIME_BEFORE_EXPIRATION, timedelta(minutes=10)),
+]
+EXPIRED_GRACE = timedelta(minutes=5)  # expiration dates are approximate, keep checking fast a bit longer
+EXPIRED_INTERVAL = timedelta(minutes=10)
+REFRESH_INTERVAL = timedelta(seconds=30)  # how often bets are reloaded from the database
+TICK_SECONDS = 1
+
+
+def first_check_time(expiration_date, current_time):
+    """Bets are not checked until TIME_BEFORE_EXPIRATION before the deadline."""
+    return max(current_time, expiration_date - TIME_BEFORE_EXPIRATION)
+
+
+def next_check_time(expiration_date, current_time):
+    """When to check an auction next: the closer the deadline, the more often."""
+    time_left = expiration_date - current_time
+
+    if time_left > TIME_BEFORE_EXPIRATION:
+        return expiration_date - TIME_BEFORE_EXPIRATION
+    if time_left < -EXPIRED_GRACE:
+        return current_time + EXPIRED_INTERVAL
+
+    faster_threshold = None
+    for threshold, interval in CHECK_CADENCE:
+        if time_left <= threshold:
+            next_time = current_time + interval
+            if faster_threshold is not None:
+                # do not jump over the start of the faster cadence
+                next_time = min(next_time, expiration_date - faster_threshold)
+            return next_time
+        faster_threshold = threshold
+
+    return current_time + CHECK_CADENCE[-1][1]
+
+
+class BidScheduler:
+    """
+    Long-running replacement for the make_bets cron job.
+
+    `schedule` is a heap of (next check, expiration, domain id). Due entries move to the `ready`
+    heap ordered by expiration, and only `concurrency` checks run at once, so domains closest
+    to expiry are always dispatched first.
+    """
+
+    def __init__(self, concurrency=BID_CONCURRENCY, rate_per_host=BID_RATE_PER_HOST):
+        self.processor = AsyncBetProcessor(concurrency=concurrency, rate_per_host=rate_per_host)
+        self.concurrency = concurrency
+        self.bets = {}  # domain_id -> Bet
+        self.scheduled = {}  # domain_id -> next check time, heap entries not matching it are stale
+        self.schedule = []
+        self.ready = []
+        self.in_flight = set()
+        self.tasks = set()
+        self.refreshed_at = None
+        self.wake = None
+        self.notifications = None
+
+    def load_bets(self):
+        close_old_connections()  # long-running process, drop connections the db has closed
+        return {bet.domain_id: bet for bet in Bet.objects.select_related('domain')}
+
+    async def refresh(self):
+        """Reload bets, schedule new ones and forget deleted ones."""
+        bets = await sync_to_async(self.load_bets)()
+        await self.processor.flush_history()
+        current_time = now()
+
+        for domain_id, bet in bets.items():
+            known = self.bets.get(domain_id)
+            if (known is None or known.created_at != bet.created_at
+                    or known.domain.expiration_date != bet.domain.expiration_date):
+                self.processor.ended.discard(domain_id)  # a new bet or a re-listed auction
+                if domain_id not in self.in_flight:
+                    self.schedule_check(domain_id, bet, first_check_time(bet.domain.expiration_date, current_time))
+
+        for domain_id in self.bets.keys() - bets.keys():
+            self.scheduled.pop(domain_id, None)
+            self.processor.ended.discard(domain_id)
+
+        if bets.keys() != self.bets.keys():
+            logger.info(f"Scheduler tracks {len(bets)} bets, {len(self.in_flight)} checks in flight.")
+        self.bets = bets
+        self.refreshed_at = current_time
+
+    def schedule_check(self, domain_id, bet, check_time):
+        self.scheduled[domain_id] = check_time
+        heapq.heappush(self.schedule, (check_time, bet.domain.expiration_date, domain_id))
+
+    def collect_due(self, current_time):
+        """Move due checks from the time heap to the deadline-ordered ready heap."""
+        while self.schedule and self.schedule[0][0] <= current_time:
+            check_time, expiration_date, domain_id = heapq.heappop(self.schedule)
+            if self.scheduled.get(domain_id) != check_time:
+                continue  # stale entry, bet was rescheduled or deleted
+            del self.scheduled[domain_id]
+            heapq.heappush(self.ready, (expiration_date, domain_id))
+
+    def dispatch(self, client):
+        night = not self.processor.is_within_bidding_hours()
+
+        while self.ready and len(self.in_flight) < self.concurrency:
+            _, domain_id = heapq.heappop(self.ready)
+            bet = self.bets.get(domain_id)
+            if bet is None or domain_id in self.in_flight:
+                continue
+            self.in_flight.add(domain_id)
+            self.spawn(self.check(client, bet, night))
+
+    def spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def check(self, client, bet, night):
+        domain_id = bet.domain_id
+        try:
+            next_bid = await self.processor.check_bet(client, bet, night)
+            if next_bid is not None:
+                # repeats of the same bid are dropped by the dispatcher (OutbidAlert)
+                self.notifications.enqueue(bet.domain.name, next_bid, bet.max_bet, domain_id)
+        except Exception as e:
+            logger.error(f"Check failed for {bet.domain.name} (ID: {domain_id}): {e}", exc_info=True)
+        finally:
+            self.in_flight.discard(domain_id)
+            bet = self.bets.get(domain_id)  # may have been reloaded while the check was running
+            if bet is not None and domain_id not in self.processor.ended:
+                self.schedule_check(domain_id, bet, next_check_time(bet.domain.expiration_date, now()))
+            self.wake.set()
+
+    async def run(self):
+        logger.info("Starting bid scheduler.")
+
+        if not await asyncio.to_thread(self.processor.is_logged_in):
+            logger.error("Unable to authenticate. Scheduler stopped.")
+            return
+
+        self.wake = asyncio.Event()
+        self.processor.login_lock = asyncio.Lock()
+
+        try:
+            async with self.processor.create_client_session() as client, NotificationDispatcher() as notifications:
+                self.notifications = notifications
+                while True:
+                    current_time = now()
+                    if self.refreshed_at is None or current_time - self.refreshed_at >= REFRESH_INTERVAL:
+                        await self.refresh()
+
+                    self.collect_due(current_time)
+                    self.dispatch(client)
+
+                    self.wake.clear()
+                    try:
+                        await asyncio.wait_for(self.wake.wait(), timeout=TICK_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            await self.processor.flush_history()  # bid history since the last refresh
+
+
+class Command(BaseCommand):
+    help = "Run the deadline-aware bid scheduler (replaces the make_bets cron job)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=BID_CONCURRENCY,
+                            help="How many domains are checked at the same time.")
+        parser.add_argument("--rate", type=float, default=BID_RATE_PER_HOST,
+                            help="Max requests per second to one host (0 - no limit).")
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write("Starting bid scheduler...")
+        scheduler = BidScheduler(concurrency=kwargs["concurrency"], rate_per_host=kwargs["rate"])
+        try:
+            asyncio.run(scheduler.run())
+        except KeyboardInterrupt:
+            logger.info("Bid scheduler stopped.")
+        except Exception as e:
+            logger.critical(f"Critical error in bid scheduler: {e}", exc_info=True)
+            raise
+        finally:
+            close_old_connections()
@@ -0,0 +1,104 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.http import QueryDict
+from django.utils.timezone import localtime, now
+
+from autobidder_app.management.commands.ahrefs_data import AHREFS_CHUNK_SIZE, AhrefsDataUpdater
+from autobidder_app.management.commands.make_bets import TIME_BEFORE_EXPIRATION
+from autobidder_app.models import AhrefsData, Bet, Domain
+from autobidder_app.utils.ahrefs_query import filter_ahrefs_data
+
+SEED_ID_START = 1_000_000_000  # far above real Voodoo ids, seeded rows are rolled back anyway
+
+
+def hot_queries():
+    """(name, queryset) for the queries the app runs most often."""
+    tomorrow = (localtime(now()) + timedelta(days=1)).date().isoformat()
+    table_params = QueryDict(mutable=True)
+    table_params.update({"start_date": tomorrow, "end_date": tomorrow, "filter-domain_rating": "10"})
+    table_queryset = filter_ahrefs_data(table_params).order_by("-domain_rating", "-domain_id")
+
+    return [
+        ("ahrefs_data_view: date range + DR filter, sorted by DR",
+         table_queryset.values("domain__domain_id", "domain__name", "domain_rating")[:101]),
+        ("ahrefs_data_view: default sort by expiration_date",
+         filter_ahrefs_data(QueryDict()).order_by("domain__expiration_date", "domain_id")[:101]),
+        ("BetProcessor: bets expiring within TIME_BEFORE_EXPIRATION",
+         Bet.objects.select_related("domain").filter(
+             domain__expiration_date__lte=now() + TIME_BEFORE_EXPIRATION
+         ).order_by("domain__expiration_date")),
+        ("AhrefsDataUpdater: next chunk of pending domains (anti-join, nearest expiration first)",
+         AhrefsDataUpdater.pending_chunk_queryset(None, AHREFS_CHUNK_SIZE)),
+        ("AhrefsDataUpdater: next chunk of a resumed run",
+         AhrefsDataUpdater.pending_chunk_queryset((now() + timedelta(days=1), SEED_ID_START), AHREFS_CHUNK_SIZE)),
+        ("Domain lookup by name",
+         Domain.objects.filter(name="seed-42.com")),
+    ]
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN (ANALYZE on PostgreSQL) the hot queries, optionally on a seeded dataset that is rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0,
+                            help="Insert N synthetic domains before explaining (rolled back afterwards).")
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            if kwargs["seed"]:
+                self.seed(kwargs["seed"])
+
+            for name, queryset in hot_queries():
+                self.explain(name, queryset)
+
+            transaction.set_rollback(True)  # never keep seeded rows
+
+    def seed(self, count):
+        started = time.perf_counter()
+        base_time = now()
+        domains = [
+            Domain(
+                domain_id=SEED_ID_START + i,
+                name=f"seed-{i}.com",
+                expiration_date=base_time + timedelta(minutes=random.randint(-60 * 24, 60 * 24 * 3)),
+            )
+            for i in range(count)
+        ]
+        Domain.objects.bulk_create(domains, batch_size=5000)
+
+        enriched = [domain for domain in domains if random.random() < 0.7]
+        AhrefsData.objects.bulk_create(
+            [AhrefsData(domain=domain, domain_rating=random.randint(0, 90), ref_domains=random.randint(0, 5000))
+             for domain in enriched],
+            batch_size=5000,
+        )
+        Bet.objects.bulk_create(
+            [Bet(domain=domain, expiration_date=domain.expiration_date, max_bet=900)
+             for domain in random.sample(domains, max(1, count // 100))],
+            batch_size=5000,
+        )
+
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+        self.stdout.write(f"Seeded {count} domains in {time.perf_counter() - started:.1f}s\n")
+
+    def explain(self, name, queryset):
+        self.stdout.write(self.style.MIGRATE_HEADING(name))
+
+        if connection.vendor == "postgresql":
+            plan = queryset.explain(analyze=True, buffers=True)
+        else:
+            plan = queryset.explain()  # ANALYZE is PostgreSQL only
+
+        started = time.perf_counter()
+        rows = len(list(queryset))
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        self.stdout.write(plan)
+        self.stdout.write(f"-> {rows} rows in {elapsed_ms:.2f} ms\n\n")
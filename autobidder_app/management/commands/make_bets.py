@@ -1,30 +1,36 @@
+import aiohttp
 import pytz
-import requests
-from bs4 import BeautifulSoup
-import re
 from django.core.management.base import BaseCommand
 from django.utils.timezone import now
 from django.db import close_old_connections
+from asgiref.sync import sync_to_async
+from decouple import config
+from yarl import URL
 
-from autobidder_app.models import Bet
+from autobidder_app.models import Bet, BidAttempt
 
 from datetime import timedelta
-from autobidder_app.utils.notification import send_bet_exceeded_message
+from autobidder_app.utils.notification import NotificationDispatcher
 from autobidder_app.views import delete_bet
 import asyncio
-import random
+import logging
 import time
+from autobidder_app.utils import html_extract
 from autobidder_app.utils.logger import setup_logger
-from autobidder_app.utils.voodoo_log_in import Authenticator
+from autobidder_app.utils.rate_limit import HostRateLimiter
+from autobidder_app.utils.voodoo_log_in import VOODOO_BASE_URL, Authenticator, LoggedOutError
 
 
 # Constants
-BID_URL_TEMPLATE = "https://voodoo.domains/uk/voodoo1domainlisting/bid?backorder_domain_id="
-LOGIN_URL = "https://voodoo.domains/uk/accounts/ajax/auth"
+BID_URL_TEMPLATE = f"{VOODOO_BASE_URL}/uk/voodoo1domainlisting/bid?backorder_domain_id="
 BIDDING_START_HOUR, BIDDING_END_HOUR = 9, 22
 bucharest_tz = pytz.timezone('Europe/Bucharest')
 TIME_BEFORE_EXPIRATION = timedelta(hours=1)
 minimal_bet = 900
+REQUEST_TIMEOUT = 10
+BID_CONCURRENCY = config("BID_CONCURRENCY", default=20, cast=int)  # domains checked at the same time
+BID_RATE_PER_HOST = config("BID_RATE_PER_HOST", default=10, cast=float)  # requests per second to one host
+HISTORY_BATCH_SIZE = 500
 
 
 # loggins
@@ -40,43 +46,22 @@ class BetProcessor(Authenticator):
             logger.info(f"BetProcessor initialized for a single domain ID: {domain_id}.")
         else:
             target_time = now().astimezone(bucharest_tz) + TIME_BEFORE_EXPIRATION
-            self.bets = Bet.objects.select_related('domain').filter(domain__expiration_date__lte=target_time)
+            self.bets = Bet.objects.select_related('domain').filter(
+                domain__expiration_date__lte=target_time
+            ).order_by('domain__expiration_date')  # closest deadlines first
             logger.info(f"BetProcessor initialized. Loaded {len(self.bets)} bets.")
 
 
 
-    def fetch_next_bid_amount(self, domain_id, domain_name):
-        """Fetch the next bid amount for a domain."""
-        logger.info(f"Fetching bid amount for domain ID: {domain_id} - {domain_name}")
+    def parse_bid_page(self, html):
+        """Extract (auction_ended, current bid, next possible bid) from a bid page."""
+        return html_extract.parse_bid_page(html)
 
-        if not self.is_logged_in() and not self.login():
-            logger.error(f"Login failed for domain ID {domain_id}. Exiting process.")
-            return None
-
-        response = self.session.get(f"{BID_URL_TEMPLATE}{domain_id}", timeout=10)
-        if response.status_code != 200:
-            logger.warning(
-                f"Failed to fetch data for domain ID {domain_id} ({domain_name}). Status: {response.status_code}")
-            return None
-
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # Check if auction has ended
-        alert_message = soup.find('div', class_='alert alert-danger alert-dismissable')
-        if alert_message and "Час прийому заявок минув" in alert_message.get_text(strip=True):
-            logger.info(f"Auction ended for domain ID {domain_id} ({domain_name}). Deleting bet from database.")
-            delete_bet(None, bet_id=domain_id)  # Call the view function directly
-            return None
-
-        # Extract input value (current bid)
-        input_value = self.get_int_value(soup.find('input', {'id': 'modal_backorder_sum'}))
+    def choose_next_bid(self, domain_id, domain_name, input_value, next_bid):
+        """Return the bid we should rise to, or None if the current bid is sufficient."""
         if input_value is None:
             logger.info(f"No input bid found for domain ID {domain_id} ({domain_name}). Assuming no current bid.")
 
-        # Extract next possible bid
-        bid_info = soup.find('p', {'id': 'modal_backorder_original_info'})
-        next_bid = self.extract_bid_value(bid_info)
-
         if next_bid is not None and (input_value is None or input_value < next_bid):
             logger.info(f"We should rise a bet to {next_bid} for domain ID {domain_id} ({domain_name})")
             return next_bid
@@ -84,121 +69,234 @@ class BetProcessor(Authenticator):
         logger.info(f"Current bid {input_value} is sufficient for domain ID {domain_id} ({domain_name}). No action needed.")
         return None
 
-    def get_int_value(self, element):  #our current bet, not bet if none
-        """Extract integer value from HTML element."""
-        if element and element.has_attr('value'):
-            try:
-                return int(element['value'].replace('\xa0', '').replace(' ', ''))
-            except ValueError:
-                logger.error("Input field is empty.")
-        return None
-
-    def extract_bid_value(self, element):
-        """Extract minimum bid value from HTML element text."""
-        if element and element.text:
-            match = re.search(r'від\s(\d+)\sдо\s(\d+)', element.text)
-            if match:
-                try:
-                    return int(match.group(1).replace('\xa0', '').replace(' ', ''))
-                except ValueError:
-                    logger.error("Failed to convert extracted bid value.")
-        return None
-
     def is_within_bidding_hours(self):
         """Check if the current time is within allowed bidding hours."""
         current_hour = now().astimezone(bucharest_tz).hour
         return BIDDING_START_HOUR <= current_hour < BIDDING_END_HOUR
 
-    def make_bid(self, domain_id, next_bid):
-        """Place a bid."""
-        bid_url = f"{BID_URL_TEMPLATE}{domain_id}"
-        payload = {
+    def bid_payload(self, next_bid):
+        return {
             "backorder_sum": next_bid,
             "form_action[save]": "Зробити пропозицію"
         }
 
-        try:
-            response = self.session.post(bid_url, data=payload, timeout=10)
-            response.raise_for_status()
+    def is_bid_accepted(self, response_text):
+        """Check for success message in bid response."""
+        return "вашу заявку успішно збережено" in response_text.lower()
+
+
+class AsyncBetProcessor(BetProcessor):
+    """Checks and places bids concurrently over aiohttp, with the bid rules of BetProcessor."""
+
+    def __init__(self, domain_id=None, concurrency=BID_CONCURRENCY, rate_per_host=BID_RATE_PER_HOST):
+        super().__init__(domain_id=domain_id)
+        self.concurrency = concurrency
+        self.rate_limiter = HostRateLimiter(rate_per_host)
+        self.latencies = {}
+        self.ended = set()  # domain ids whose auction is over
+        self.history = []  # BidAttempt rows not saved yet
+        self.login_lock = None
+
+    def create_client_session(self):
+        """aiohttp session that reuses the cookies of the logged in requests session."""
+        cookie_jar = aiohttp.CookieJar()
+        cookie_jar.update_cookies(self.session.cookies.get_dict(), URL(BID_URL_TEMPLATE))
+        return aiohttp.ClientSession(
+            cookie_jar=cookie_jar,
+            connector=aiohttp.TCPConnector(limit=self.concurrency),
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+        )
+
+    async def request_async(self, client, method, url, data=None):
+        """
+        Rate limited request, returns (status, text). Re-logins once if the response shows we were logged out,
+        raises LoggedOutError if it still does.
+        """
+        login_count = self.login_count
+        status, text = await self.send_async(client, method, url, data)
+
+        if self.is_logged_out_response(text):
+            if await self.relogin_async(client, login_count):
+                status, text = await self.send_async(client, method, url, data)
+            if self.is_logged_out_response(text):
+                # the login form must not be parsed as a bid page
+                raise LoggedOutError(f"Logged out of Voodoo, re-login failed ({method} {url})")
+        return status, text
+
+    async def send_async(self, client, method, url, data=None):
+        await self.rate_limiter.acquire(url)
+        async with client.request(method, url, data=data) as response:
+            return response.status, await response.text()
+
+    async def relogin_async(self, client, seen_login_count):
+        """Log in again once for all tasks that saw the logged out response, then share the new cookies."""
+        async with self.login_lock:
+            if self.login_count == seen_login_count:
+                await asyncio.to_thread(self.relogin)
+            client.cookie_jar.update_cookies(self.session.cookies.get_dict(), URL(BID_URL_TEMPLATE))
+        return self.is_authenticated
+
+    async def fetch_next_bid_amount_async(self, client, domain_id, domain_name, attempt):
+        """Fetch the next bid amount for a domain. What the page showed is recorded in `attempt`."""
+        logger.info(f"Fetching bid amount for domain ID: {domain_id} - {domain_name}",
+                    extra={"domain_id": domain_id, "action": "fetch"})
+
+        started = time.perf_counter()
+        status, html = await self.request_async(client, "GET", f"{BID_URL_TEMPLATE}{domain_id}")
+        attempt.status, attempt.fetch_ms = status, (time.perf_counter() - started) * 1000
+        if status != 200:
+            logger.warning(f"Failed to fetch data for domain ID {domain_id} ({domain_name}). Status: {status}",
+                           extra={"domain_id": domain_id, "action": "fetch_failed", "status": status})
+            attempt.result = "fetch_failed"
+            return None
 
-            # Debug response text
-            logger.debug(f"Response Text Snippet: {response.text[:500]}")
+        auction_ended, input_value, next_bid = self.parse_bid_page(html)
+        attempt.current_bid, attempt.next_bid = input_value, next_bid
 
-            # Check for success message in response
-            if "вашу заявку успішно збережено" in response.text.lower():
-                logger.info(f"Successfully placed bid of {next_bid} for domain ID {domain_id}.")
-                return True
-            else:
-                logger.error(f"Failed to place bid for domain ID {domain_id}. Response did not indicate success.")
-        except (requests.RequestException, ValueError) as e:
-            logger.error(f"Error placing bid for domain ID {domain_id}: {e}")
-        return False
+        if auction_ended:
+            logger.info(f"Auction ended for domain ID {domain_id} ({domain_name}). Deleting bet from database.",
+                        extra={"domain_id": domain_id, "action": "auction_ended"})
+            attempt.result = "ended"
+            self.ended.add(domain_id)
+            await sync_to_async(delete_bet)(None, bet_id=domain_id)
+            return None
 
-    def process_bets(self, domain_id=None):
-        """Process all bets or a specific domain if provided."""
-        logger.info("Starting bet processing.")
+        next_bid = self.choose_next_bid(domain_id, domain_name, input_value, next_bid)
+        if next_bid is None:
+            attempt.result = "leading"
+        return next_bid
 
-        if not self.is_logged_in() and not self.login(): #if logged in self login is not called
-            logger.error("Skipping all bets - Unable to authenticate.")
-            return
+    async def make_bid_async(self, client, domain_id, next_bid, attempt):
+        """Place a bid, the outcome is recorded in `attempt`."""
+        bid_url = f"{BID_URL_TEMPLATE}{domain_id}"
+        attempt.our_bid, attempt.result = next_bid, "bid_failed"
 
-        # If domain_id is specified, filter bets for that domain only
-        if domain_id:
-            self.bets = self.bets.filter(domain__domain_id=domain_id)
-            logger.info(f"Processing a single bet for domain ID {domain_id}")
+        try:
+            started = time.perf_counter()
+            status, response_text = await self.request_async(client, "POST", bid_url, data=self.bid_payload(next_bid))
+            attempt.status, attempt.bid_ms = status, (time.perf_counter() - started) * 1000
+            if status >= 400:
+                logger.error(f"Error placing bid for domain ID {domain_id}: status {status}",
+                             extra={"domain_id": domain_id, "action": "bid_failed", "bid": next_bid, "status": status})
+                return False
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Response Text Snippet: {response_text[:500]}")
+
+            if self.is_bid_accepted(response_text):
+                logger.info(f"Successfully placed bid of {next_bid} for domain ID {domain_id}.",
+                            extra={"domain_id": domain_id, "action": "bid", "bid": next_bid})
+                attempt.result = "bid_placed"
+                return True
+            logger.error(f"Failed to place bid for domain ID {domain_id}. Response did not indicate success.",
+                         extra={"domain_id": domain_id, "action": "bid_failed", "bid": next_bid})
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Error placing bid for domain ID {domain_id}: {e}")
+        return False
 
-        for bet in self.bets:
-            next_bid = self.fetch_next_bid_amount(bet.domain.domain_id, bet.domain.name)
+    async def check_bet(self, client, bet, night=False):
+        """Fetch -> compare max_bet -> bid for one domain. Returns the next bid if we were outbid, else None."""
+        started = time.perf_counter()
+        attempt = BidAttempt(domain_id=bet.domain.domain_id, max_bet=bet.max_bet, result="error")
+        try:
+            next_bid = await self.fetch_next_bid_amount_async(client, bet.domain.domain_id, bet.domain.name, attempt)
             if next_bid is None:
-                continue
+                return None
 
-            if bet.max_bet >= next_bid:
-                if self.make_bid(bet.domain.domain_id, next_bid):
+            if night and next_bid > minimal_bet:
+                logger.info(f"Skipping {bet.domain.name} - A bid has already been placed, we do not rise bets at night time (Next bid: {next_bid}).")
+                attempt.result = "night_skip"
+            elif bet.max_bet >= next_bid:
+                if await self.make_bid_async(client, bet.domain.domain_id, next_bid, attempt):
                     logger.info(f"Bid of {next_bid} placed for {bet.domain.name}.")
                 else:
                     logger.error(f"Failed to place bid for {bet.domain.name}.")
             else:
-                logger.info(f"Max bet {bet.max_bet} is too low for {bet.domain.name}. Sending notification.")
-                asyncio.run(send_bet_exceeded_message(bet.domain.name, next_bid, bet.max_bet, bet.domain.domain_id))
+                attempt.result = "outbid"
+                if not night:
+                    logger.info(f"Max bet {bet.max_bet} is too low for {bet.domain.name}. Sending notification.",
+                                extra={"domain_id": bet.domain.domain_id, "action": "outbid",
+                                       "next_bid": next_bid, "max_bet": bet.max_bet})
+                    return next_bid
+        except (aiohttp.ClientError, asyncio.TimeoutError, LoggedOutError) as e:
+            logger.error(f"Error processing domain ID {bet.domain.domain_id} ({bet.domain.name}): {e}")
+        except Exception as e:
+            # unexpected markup or a DB error must not stop the other domains of the run
+            logger.error(f"Unexpected error processing domain ID {bet.domain.domain_id} ({bet.domain.name}): {e}",
+                         exc_info=True)
+        finally:
+            latency_ms = (time.perf_counter() - started) * 1000
+            self.latencies[bet.domain.domain_id] = latency_ms
+            attempt.total_ms = latency_ms
+            self.history.append(attempt)
+            logger.info(f"Processed {bet.domain.name} (ID: {bet.domain.domain_id}) in {latency_ms:.0f} ms",
+                        extra={"domain_id": bet.domain.domain_id, "domain": bet.domain.name,
+                               "action": "processed", "latency_ms": round(latency_ms, 1)})
+        return None
 
-        logger.info("Bet processing completed.")
+    async def process_bet_async(self, client, semaphore, bet, night, notifications):
+        """Check one bet within the concurrency limit. Outbid domains are queued for notification."""
+        async with semaphore:
+            next_bid = await self.check_bet(client, bet, night)
+        if next_bid is not None:
+            notifications.enqueue(bet.domain.name, next_bid, bet.max_bet, bet.domain.domain_id)
+
+    async def process_batch(self, client, bets, notifications, night=False):
+        """Process a list of bets concurrently, limited by self.concurrency."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        await asyncio.gather(
+            *(self.process_bet_async(client, semaphore, bet, night, notifications) for bet in bets)
+        )
+
+    async def process_bets_async(self, bets, night=False):
+        self.login_lock = asyncio.Lock()
+        try:
+            async with self.create_client_session() as client, NotificationDispatcher() as notifications:
+                await self.process_batch(client, bets, notifications, night=night)
+        finally:
+            await self.flush_history()
 
-    def process_night_bets(self):
-        """Process bets that expire at night time. Makes a bid only if there were no bids before."""
-        logger.info("Checking night bets.")
+    async def flush_history(self):
+        """Bulk insert the recorded BidAttempt rows."""
+        attempts, self.history = self.history, []
+        if attempts:
+            await sync_to_async(BidAttempt.objects.bulk_create)(attempts, batch_size=HISTORY_BATCH_SIZE)
 
-        if not self.is_logged_in():
-            if not self.login():
-                logger.error("Skipping all bets - Unable to authenticate.")
-                return
+    def run(self, night=False):
+        """Authenticate, then process all loaded bets in one event loop."""
+        logger.info("Starting night bet processing." if night else "Starting bet processing.")
 
-        for bet in self.bets:
-            next_bid = self.fetch_next_bid_amount(bet.domain.domain_id, bet.domain.name)
+        if not self.is_logged_in() and not self.login():
+            logger.error("Skipping all bets - Unable to authenticate.")
+            return
 
-            #prevent error
-            if next_bid is None:
-                continue
+        bets = list(self.bets)  # evaluate the queryset outside of the event loop
+        asyncio.run(self.process_bets_async(bets, night=night))
+        self.log_latency_report()
+        logger.info("Night bet processing completed." if night else "Bet processing completed.")
 
-            if next_bid > minimal_bet:
-                logger.info(f"Skipping {bet.domain.name} - A bid has already been placed, we do not rise bets at night time (Next bid: {next_bid}).")
-                continue
+    def log_latency_report(self):
+        """Log min/avg/max per-domain latency of the last run."""
+        if not self.latencies:
+            return
+        values = sorted(self.latencies.values())
+        logger.info(
+            f"Latency for {len(values)} domains: min {values[0]:.0f} ms, "
+            f"avg {sum(values) / len(values):.0f} ms, max {values[-1]:.0f} ms")
 
-            if bet.max_bet >= next_bid:
-                if self.make_bid(bet.domain.domain_id, next_bid):
-                    logger.info(f"Night bid of {next_bid} placed for {bet.domain.name}.")
-                else:
-                    logger.error(f"Failed to place night bid for {bet.domain.name}.")
-        logger.info("Night bet processing completed.")
+    def process_bets(self, domain_id=None):
+        if domain_id:
+            self.bets = self.bets.filter(domain__domain_id=domain_id)
+            logger.info(f"Processing a single bet for domain ID {domain_id}")
+        self.run()
+
+    def process_night_bets(self):
+        self.run(night=True)
 
 
-def run_bet_processing(domain_id=None):
+def run_bet_processing(domain_id=None, concurrency=BID_CONCURRENCY, rate_per_host=BID_RATE_PER_HOST):
     """Process betting for all domains or a single domain if specified."""
-    if domain_id is None:
-        delay = random.randint(60, 600)
-        logger.info(f"Delaying bet processing by {delay} seconds...")
-        time.sleep(delay)
-
-    processor = BetProcessor(domain_id=domain_id)
+    processor = AsyncBetProcessor(domain_id=domain_id, concurrency=concurrency, rate_per_host=rate_per_host)
 
     if domain_id:
         logger.info(f"Processing bid for single domain ID: {domain_id}")
@@ -214,9 +312,15 @@ def run_bet_processing(domain_id=None):
 class Command(BaseCommand):
     help = 'Process bets processing.'
 
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=BID_CONCURRENCY,
+                            help="How many domains are checked at the same time.")
+        parser.add_argument("--rate", type=float, default=BID_RATE_PER_HOST,
+                            help="Max requests per second to one host (0 - no limit).")
+
     def handle(self, *args, **kwargs):
         try:
-            run_bet_processing()
+            run_bet_processing(concurrency=kwargs["concurrency"], rate_per_host=kwargs["rate"])
         except Exception as e:
             logger.critical(f"Critical error in bet processor: {e}", exc_info=True)
         finally:
@@ -42,7 +42,7 @@ def create_simulated_bets():
 
 async def process_simulated_bets():
     """Process bets from the database and send notifications."""
-    from autobidder_app.utils.notification import send_bet_exceeded_message  # ✅ Import inside function
+    from autobidder_app.utils.notification import send_alerts  # ✅ Import inside function
 
     logging.info("Starting simulated bet processing...")
 
@@ -50,6 +50,7 @@ async def process_simulated_bets():
     target_time = now() + TIME_BEFORE_EXPIRATION
     bets = await sync_to_async(list)(Bet.objects.select_related("domain").filter(domain__expiration_date__lte=target_time))
 
+    alerts = []
     for bet in bets:
         logging.info(f"Checking bet for {bet.domain.name}")
         expiration_time = bet.domain.expiration_date
@@ -64,11 +65,9 @@ async def process_simulated_bets():
             logging.info(f"Simulated bid within limit for {bet.domain.name}")
         else:
             logging.info(f"Sending notification for {bet.domain.name}")
-            try:
-                await send_bet_exceeded_message(bet.domain.name, next_bid, bet.max_bet, bet.domain.domain_id)
-                logging.info(f"Notification sent for {bet.domain.name}")
-            except Exception as e:
-                logging.error(f"Error sending message: {e}")
+            alerts.append((bet.domain.name, next_bid, bet.max_bet, bet.domain.domain_id))
+
+    await send_alerts(alerts)
 
     logging.info("Simulated bet processing completed.")
 class Command(BaseCommand):
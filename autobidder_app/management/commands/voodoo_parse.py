@@ -1,75 +1,134 @@
 import os
-import requests
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from decouple import config
 from datetime import datetime, timedelta
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
 from django.utils.timezone import localtime, make_aware, now
-from autobidder_app.models import Domain
+from autobidder_app.models import Bet, Domain
 
 
+from autobidder_app.utils import html_extract
 from autobidder_app.utils.logger import setup_logger
-from autobidder_app.utils.voodoo_log_in import Authenticator
+from autobidder_app.utils.voodoo_log_in import VOODOO_BASE_URL, Authenticator
 
 
 #logging
 logger = setup_logger("voodoo_parser", log_directory="logs/voodoo", days=7)
 
-BASE_URL = "https://voodoo.domains/uk/listings/all"
+BASE_URL = f"{VOODOO_BASE_URL}/uk/listings/all"
+PARSER_WORKERS = config("VOODOO_PARSER_WORKERS", default=8, cast=int)  # keep below requests' pool size (10)
+UPSERT_BATCH_SIZE = 1000
 
 
-def process_pages(session: requests.Session, day_param: int) -> None:
-    """Fetch all pages from Voodoo listings and process their content."""
-    response = session.get(BASE_URL, params={"day": day_param})
+def process_pages(auth: Authenticator, day_param: int) -> None:
+    """
+    Fetch all pages from Voodoo listings and process their content.
+
+    Pages 2..N are fetched and parsed by a bounded pool of worker threads,
+    parsed rows are streamed to the database in this thread as pages complete
+    and written in batches of UPSERT_BATCH_SIZE.
+    """
+    response = auth.request("get", BASE_URL, params={"day": day_param})
 
     if not response.ok:
         logger.warning("Failed to fetch the first page")
         return
 
-    soup = BeautifulSoup(response.text, "html.parser")
-    total_pages = extract_total_pages(soup)
+    total_pages, rows = html_extract.parse_listing(response.text)
     logger.info(f"Total pages found: {total_pages}")
-    get_domains_from_page(soup) #fist page parse with no extra request
-    for page in range(1, total_pages + 1):
-        logger.info(f"Processing page {page}")
-        response = session.get(BASE_URL, params={"day": day_param, "page": page})
-        if not response.ok:
-            logger.warning(f"Failed to fetch page {page}")
-            continue
-
-        soup = BeautifulSoup(response.text, "html.parser")
-        get_domains_from_page(soup)
-
-
-def extract_total_pages(soup: BeautifulSoup) -> int:
-    """Get pages number"""
-    pagination = soup.find("ul", class_="pagination")
-    if pagination:
-        page_numbers = [int(link.text) for link in pagination.find_all("a") if link.text.isdigit()]
-        return max(page_numbers, default=1)
-    return 1
 
+    upserter = DomainUpserter()
+    upserter.add(get_domains_from_rows(rows))  # fist page parse with no extra request
 
-def get_domains_from_page(soup: BeautifulSoup) -> None:
-    """Get domain names from the page"""
-    rows = soup.find_all("tr", style="cursor: pointer;")
-    for row in rows:
-        process_domain_row(row)
+    try:
+        with ThreadPoolExecutor(max_workers=PARSER_WORKERS) as executor:
+            futures = {
+                executor.submit(fetch_page_domains, auth, day_param, page): page
+                for page in range(2, total_pages + 1)
+            }
+            for future in as_completed(futures):
+                try:
+                    upserter.add(future.result())
+                except Exception as e:
+                    logger.error(f"Failed to process page {futures[future]}: {e}")
+    finally:
+        upserter.flush()
+
+
+def fetch_page_domains(auth: Authenticator, day_param: int, page: int) -> list:
+    """Fetch one listing page and parse its rows (runs in a worker thread)."""
+    logger.info(f"Processing page {page}")
+    response = auth.request("get", BASE_URL, params={"day": day_param, "page": page})
+    if not response.ok:
+        logger.warning(f"Failed to fetch page {page}")
+        return []
 
+    _, rows = html_extract.parse_listing(response.text)
+    return get_domains_from_rows(rows)
 
-def process_domain_row(row):
-    """Save domain details."""
-    domain_id = row.get("data-id")
-    domain_name = row.find("div", class_="fqdn").text.strip() if row.find("div", class_="fqdn") else None
-    expiration_date = parse_date(row.find_all("td", class_="text-center")[1].text.strip()) if row.find_all("td", class_="text-center") else None
 
-    if domain_id and domain_name and expiration_date:
-        Domain.objects.get_or_create(
-            domain_id=domain_id,
-            defaults={"name": domain_name, "expiration_date": expiration_date}
-        )
-        logger.info(f"Processed domain: {domain_name}")
-    else:
-        logger.warning(f"Skipping incomplete domain data: ID={domain_id}, Name={domain_name}")
+def get_domains_from_rows(rows: list) -> list:
+    """Turn extracted rows into (domain_id, name, expiration_date), skipping incomplete or malformed ones."""
+    domains = []
+    for raw_id, domain_name, raw_date in rows:
+        try:
+            domain_id = int(raw_id)
+        except (TypeError, ValueError):
+            logger.warning(f"Skipping row with invalid domain ID: ID={raw_id!r}, Name={domain_name}")
+            continue
+        expiration_date = parse_date(raw_date) if raw_date else None
+
+        if domain_id and domain_name and expiration_date:
+            domains.append((domain_id, domain_name, expiration_date))
+        else:
+            logger.warning(f"Skipping incomplete domain data: ID={domain_id}, Name={domain_name}")
+    return domains
+
+
+class DomainUpserter:
+    """Collects parsed rows and writes them in batches, one INSERT ... ON CONFLICT per batch."""
+
+    def __init__(self, batch_size: int = UPSERT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.pending = {}  # keyed by domain_id, a row may not be updated twice in one statement
+        self.saved = 0
+
+    def add(self, domains: list) -> None:
+        for domain_id, domain_name, expiration_date in domains:
+            self.pending[domain_id] = Domain(domain_id=domain_id, name=domain_name, expiration_date=expiration_date)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Insert new domains, update name and expiration_date of known ones.
+        Bets on updated domains get the new expiration_date in the same transaction, the scheduler plans by it.
+        """
+        if not self.pending:
+            return
+
+        with transaction.atomic():
+            Domain.objects.bulk_create(
+                self.pending.values(),
+                batch_size=self.batch_size,
+                update_conflicts=True,
+                unique_fields=["domain_id"],
+                update_fields=["name", "expiration_date"],
+            )
+            moved = Bet.objects.filter(domain_id__in=list(self.pending)).exclude(
+                expiration_date=F("domain__expiration_date")
+            ).update(
+                expiration_date=Subquery(
+                    Domain.objects.filter(domain_id=OuterRef("domain_id")).values("expiration_date")[:1]
+                )
+            )
+        if moved:
+            logger.info(f"Updated expiration date of {moved} bets.")
+        self.saved += len(self.pending)
+        logger.info(f"Saved {len(self.pending)} domains ({self.saved} in total).")
+        self.pending.clear()
 
 
 def parse_date(raw_date: str):
@@ -90,7 +149,6 @@ def run_parser():
             logger.error("Authorization failed.")
             return {"status": "error", "message": "Authorization failed."}
 
-        session = auth.session
         #set the last day avaiable (+3 days from today)
         day_param = int(
             (localtime(now()) + timedelta(days=3))
@@ -98,7 +156,7 @@ def run_parser():
             .timestamp()
         )
 
-        process_pages(session, day_param)
+        process_pages(auth, day_param)
 
         return {"status": "success", "message": "Parsing completed successfully."}
     except Exception as e:
@@ -0,0 +1,47 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from autobidder_app.benchmarks.voodoo_standin import VoodooStandin
+from autobidder_app.management.commands.benchmark_pipeline import BENCHMARK_ID_START
+
+
+class Command(BaseCommand):
+    help = "Serve an offline Voodoo stand-in, point the app to it with VOODOO_BASE_URL=http://localhost:<port>."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="localhost")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--domains", type=int, default=1000, help="Auctions served by the stand-in.")
+        parser.add_argument("--window", type=int, default=3600, help="Seconds over which the auctions end.")
+        parser.add_argument("--latency", type=int, default=50, help="Average response time, ms.")
+        parser.add_argument("--competitor-rate", type=float, default=2.0,
+                            help="Competitor bids per auction per minute.")
+        parser.add_argument("--session-ttl", type=int, default=None,
+                            help="Seconds until a login expires (default: never).")
+
+    def handle(self, *args, **kwargs):
+        first_expiration = now() + timedelta(minutes=5)
+        step = timedelta(seconds=kwargs["window"]) / max(kwargs["domains"], 1)
+        domains = [
+            (BENCHMARK_ID_START + i, f"bench-{i}.com.ua", (first_expiration + step * i).replace(microsecond=0))
+            for i in range(kwargs["domains"])
+        ]
+
+        standin = VoodooStandin(domains, latency=kwargs["latency"] / 1000,
+                                competitor_rate=kwargs["competitor_rate"], session_ttl=kwargs["session_ttl"])
+        standin.start(kwargs["host"], kwargs["port"])
+        self.stdout.write(f"Voodoo stand-in with {len(domains)} auctions on http://{kwargs['host']}:{kwargs['port']}")
+
+        try:
+            while True:
+                time.sleep(60)
+                won, missed = standin.results()
+                self.stdout.write(f"{standin.requests} requests, {standin.bids_accepted} bids, "
+                                  f"{won} won, {missed} missed")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            standin.stop()
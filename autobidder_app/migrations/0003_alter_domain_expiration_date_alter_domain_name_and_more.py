@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autobidder_app', '0002_alter_bet_domain_alter_bet_max_bet'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='domain',
+            name='expiration_date',
+            field=models.DateTimeField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='domain',
+            name='name',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='ahrefsdata',
+            index=models.Index(fields=['domain_rating', 'domain'], name='ahrefs_domain_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ahrefsdata',
+            index=models.Index(fields=['ref_domains', 'domain'], name='ahrefs_ref_domains_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autobidder_app', '0003_alter_domain_expiration_date_alter_domain_name_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutbidAlert',
+            fields=[
+                ('bet', models.OneToOneField(db_column='domain_id', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='outbid_alert', serialize=False, to='autobidder_app.bet')),
+                ('current_bet', models.IntegerField()),
+                ('sent_at', models.DateTimeField()),
+                ('times_sent', models.IntegerField(default=1)),
+            ],
+        ),
+    ]
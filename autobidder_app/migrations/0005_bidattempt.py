@@ -0,0 +1,35 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:27
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autobidder_app', '0004_outbidalert'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BidAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('current_bid', models.IntegerField(null=True)),
+                ('next_bid', models.IntegerField(null=True)),
+                ('max_bet', models.IntegerField()),
+                ('our_bid', models.IntegerField(null=True)),
+                ('result', models.CharField(choices=[('bid_placed', 'Bid placed'), ('bid_failed', 'Bid failed'), ('leading', 'Our bid is current'), ('outbid', 'Above max bet'), ('night_skip', 'Skipped at night'), ('ended', 'Auction ended'), ('fetch_failed', 'Fetch failed'), ('error', 'Error')], max_length=20)),
+                ('status', models.IntegerField(null=True)),
+                ('fetch_ms', models.FloatField(null=True)),
+                ('bid_ms', models.FloatField(null=True)),
+                ('total_ms', models.FloatField(null=True)),
+                ('domain', models.ForeignKey(db_column='domain_id', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='bid_attempts', to='autobidder_app.domain')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['domain', 'created_at'], name='bid_attempt_domain_time_idx'), models.Index(fields=['created_at'], name='bid_attempt_time_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autobidder_app', '0005_bidattempt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AhrefsResponse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('endpoint', models.CharField(max_length=50)),
+                ('target', models.CharField(max_length=255)),
+                ('response', models.JSONField()),
+                ('units', models.IntegerField(default=1)),
+                ('fetched_at', models.DateTimeField()),
+                ('last_used_at', models.DateTimeField()),
+                ('hits', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['last_used_at'], name='ahrefs_response_lru_idx')],
+                'constraints': [models.UniqueConstraint(fields=('endpoint', 'target'), name='ahrefs_response_key')],
+            },
+        ),
+    ]
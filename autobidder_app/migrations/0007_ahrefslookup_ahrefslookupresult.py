@@ -0,0 +1,40 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:35
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autobidder_app', '0006_ahrefsresponse'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AhrefsLookup',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('total', models.IntegerField()),
+                ('done', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('finished_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AhrefsLookupResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.IntegerField()),
+                ('domain', models.CharField(max_length=255)),
+                ('data', models.JSONField(null=True)),
+                ('lookup', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='autobidder_app.ahrefslookup')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('lookup', 'position'), name='ahrefs_lookup_result_position')],
+            },
+        ),
+    ]
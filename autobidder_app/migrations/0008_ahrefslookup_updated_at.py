@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autobidder_app', '0007_ahrefslookup_ahrefslookupresult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ahrefslookup',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
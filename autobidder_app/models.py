@@ -1,9 +1,12 @@
+import uuid
+
 from django.db import models
+from django.utils.timezone import now
 
 class Domain(models.Model):
     domain_id = models.IntegerField(primary_key=True)
-    name = models.CharField(max_length=255)
-    expiration_date = models.DateTimeField()
+    name = models.CharField(max_length=255, db_index=True)
+    expiration_date = models.DateTimeField(db_index=True)
 
     def __str__(self):
         return self.name
@@ -44,6 +47,13 @@ class AhrefsData(models.Model):
     linked_root_domains = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # (sort column, pk) matches the keyset order of the Ahrefs table
+        indexes = [
+            models.Index(fields=["domain_rating", "domain"], name="ahrefs_domain_rating_idx"),
+            models.Index(fields=["ref_domains", "domain"], name="ahrefs_ref_domains_idx"),
+        ]
+
     def __str__(self):
         return f"Ahrefs Data for {self.domain.name}"
 
@@ -64,4 +74,123 @@ class Bet(models.Model):
     max_bet = models.IntegerField()
 
     def __str__(self):
-        return f"Bet for domain {self.domain_id} with max bet {self.max_bet}"
\ No newline at end of file
+        return f"Bet for domain {self.domain_id} with max bet {self.max_bet}"
+
+class OutbidAlert(models.Model):
+    """Last outbid alert sent for a bet, so the same competing bid is not reported again and again."""
+    bet = models.OneToOneField(
+        Bet,
+        on_delete=models.CASCADE,
+        related_name="outbid_alert",
+        db_column="domain_id",
+        primary_key=True
+    )
+    current_bet = models.IntegerField()
+    sent_at = models.DateTimeField()
+    times_sent = models.IntegerField(default=1)
+
+    def __str__(self):
+        return f"Outbid alert for domain {self.bet_id} at {self.current_bet}"
+
+
+class BidAttempt(models.Model):
+    """
+    One check of an auction by the bidder: what Voodoo showed, what we did and how long it took.
+    Kept as history, so it is not removed together with the domain.
+    """
+    RESULT_CHOICES = [
+        ("bid_placed", "Bid placed"),
+        ("bid_failed", "Bid failed"),
+        ("leading", "Our bid is current"),
+        ("outbid", "Above max bet"),
+        ("night_skip", "Skipped at night"),
+        ("ended", "Auction ended"),
+        ("fetch_failed", "Fetch failed"),
+        ("error", "Error"),
+    ]
+
+    domain = models.ForeignKey(
+        Domain,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="bid_attempts",
+        db_column="domain_id"
+    )
+    created_at = models.DateTimeField(default=now)
+    current_bid = models.IntegerField(null=True)
+    next_bid = models.IntegerField(null=True)
+    max_bet = models.IntegerField()
+    our_bid = models.IntegerField(null=True)
+    result = models.CharField(max_length=20, choices=RESULT_CHOICES)
+    status = models.IntegerField(null=True)  # HTTP status of the last request
+    fetch_ms = models.FloatField(null=True)
+    bid_ms = models.FloatField(null=True)
+    total_ms = models.FloatField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["domain", "created_at"], name="bid_attempt_domain_time_idx"),
+            models.Index(fields=["created_at"], name="bid_attempt_time_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.result} for domain {self.domain_id} at {self.created_at}"
+
+
+class AhrefsResponse(models.Model):
+    """Cached Ahrefs API response, a re-listed domain is not paid for again while the entry is fresh."""
+    endpoint = models.CharField(max_length=50)
+    target = models.CharField(max_length=255)
+    response = models.JSONField()
+    units = models.IntegerField(default=1)  # API units the request cost
+    fetched_at = models.DateTimeField()
+    last_used_at = models.DateTimeField()
+    hits = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["endpoint", "target"], name="ahrefs_response_key"),
+        ]
+        indexes = [
+            models.Index(fields=["last_used_at"], name="ahrefs_response_lru_idx"),
+        ]
+
+    def __str__(self):
+        return f"Ahrefs {self.endpoint} for {self.target} ({self.hits} hits)"
+
+
+class AhrefsLookup(models.Model):
+    """Bulk lookup from the ahrefs-test page, fetched in the background, see utils/ahrefs_lookup.py."""
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    total = models.IntegerField()
+    done = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)  # last progress, a stuck lookup stops moving it
+    finished_at = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f"Ahrefs lookup {self.id}: {self.status}, {self.done}/{self.total}"
+
+
+class AhrefsLookupResult(models.Model):
+    lookup = models.ForeignKey(AhrefsLookup, on_delete=models.CASCADE, related_name="results")
+    position = models.IntegerField()  # order of the domain in the pasted list
+    domain = models.CharField(max_length=255)
+    data = models.JSONField(null=True)  # None - Ahrefs returned nothing for the domain
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["lookup", "position"], name="ahrefs_lookup_result_position"),
+        ]
+
+    def __str__(self):
+        return f"{self.domain} in lookup {self.lookup_id}"
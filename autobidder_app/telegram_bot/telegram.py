@@ -1,10 +1,12 @@
 
-import requests
 from aiogram import Bot, Dispatcher, types
 from decouple import config
 from aiogram.filters import Command
+from django.db import close_old_connections
 
 from autobidder_app.management.commands.make_bets import run_bet_processing
+from autobidder_app.models import Bet, OutbidAlert
+from autobidder_app.utils.notification import DIGEST_TITLE
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 
@@ -15,7 +17,6 @@ logger = setup_logger("telegram", log_directory="logs/telegram", days=7)
 
 TOKEN = config("TELEGRAM_TOKEN")
 GROUP_CHAT_ID = int(config("GROUP_CHAT_ID"))
-BASE_URL = config("BASE_URL", default="http://127.0.0.1:8000")
 
 bot = Bot(TOKEN)
 dp = Dispatcher()
@@ -27,7 +28,70 @@ async def test_command_handler(message: types.Message):
     await message.reply(f"✅ The bot is working correctly! Your chat ID: {message.chat.id}")
 
 
-executor = ThreadPoolExecutor()
+# re-processing runs on its own small pool, one job per domain at a time
+BID_WORKERS = config("TELEGRAM_BID_WORKERS", default=4, cast=int)
+executor = ThreadPoolExecutor(max_workers=BID_WORKERS, thread_name_prefix="bid-worker")
+in_progress = set()
+background_tasks = set()
+
+
+def reprocess_bet(domain_id):
+    """Runs in a bid worker thread."""
+    close_old_connections()
+    try:
+        run_bet_processing(domain_id)
+    finally:
+        close_old_connections()
+
+
+async def reprocess_and_report(message, domain_id, status_text):
+    """Re-bid one domain on the worker pool and edit the message with the outcome."""
+    try:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(executor, reprocess_bet, domain_id)
+        result_text = "🔁 Bid re-checked."
+    except Exception as e:
+        logger.error(f"Bet re-processing failed for domain ID {domain_id}: {e}", exc_info=True)
+        result_text = "❌ Re-check failed. Check logs."
+    finally:
+        in_progress.discard(domain_id)
+
+    try:
+        await message.edit_text(f"{status_text}\n{result_text}", reply_markup=None)
+    except Exception as e:
+        logger.error(f"Failed to send status for domain ID {domain_id}: {e}")
+
+
+def schedule_reprocessing(message, domain_id, status_text):
+    """Start re-processing in the background, the caller has already added `domain_id` to in_progress."""
+    task = asyncio.create_task(reprocess_and_report(message, domain_id, status_text))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+def domain_name_from_message(message_text, domain_id):
+    """Domain name from a single alert ("Domain: x") or from its digest line ("• x (ID 1): ...")."""
+    for line in message_text.split("\n"):
+        if "Domain:" in line:
+            return line.split(":")[-1].strip()
+        if f"(ID {domain_id})" in line:
+            return line.lstrip("• ").split(" (ID")[0]
+    return f"ID {domain_id}"
+
+
+def callback_domain_id(callback_data):
+    parts = callback_data.split("_")
+    return int(parts[1] if parts[0] == "cancel" else parts[2])
+
+
+def without_domain_buttons(keyboard, domain_id):
+    """Digest keyboard without the row of `domain_id`, None when no rows are left."""
+    rows = [
+        row for row in keyboard.inline_keyboard
+        if not any(callback_domain_id(button.callback_data) == domain_id for button in row)
+    ]
+    return types.InlineKeyboardMarkup(inline_keyboard=rows) if rows else None
+
 
 @dp.callback_query()
 async def handle_callback_query(callback_query: types.CallbackQuery):
@@ -39,6 +103,8 @@ async def handle_callback_query(callback_query: types.CallbackQuery):
         parts = callback_data.split("_")
         action = parts[0]
         response_text = "⚠️ Unknown response."
+        domain_id = None
+        reprocess = None  # (domain_id, status_text) to re-bid once the reply is sent
 
         if action == "increase":
             if len(parts) != 4:
@@ -52,38 +118,46 @@ async def handle_callback_query(callback_query: types.CallbackQuery):
             new_max_bet = current_bet + amount
 
             # Extract domain name from message text
-            message_text = callback_query.message.text
-            domain_name = next(
-                (line.split(":")[-1].strip() for line in message_text.split("\n") if "Domain:" in line),
-                f"ID {domain_id}"
-            )
+            domain_name = domain_name_from_message(callback_query.message.text, domain_id)
 
             logger.info(f"Increasing bet for {domain_name} (Domain ID: {domain_id}) by {amount}, New max bet: {new_max_bet}")
 
-            # Send max bet update request
-            response = requests.post(
-                f"{BASE_URL}/update-max-bet/{domain_id}/",
-                data={"max_bet": new_max_bet}
-            )
-            logger.info(f"Update response: {response.status_code}, {response.text}")
+            updated = await Bet.objects.filter(domain_id=domain_id).aupdate(max_bet=new_max_bet)
+            logger.info(f"Update result for domain ID {domain_id}: {updated} row(s)")
 
-            if response.status_code == 200:
+            if updated:
+                # the next outbid at the same price is news again under the new limit
+                await OutbidAlert.objects.filter(bet_id=domain_id).adelete()
                 response_text = f"✅ Bet updated to {new_max_bet} UAH for {domain_name}."
-
-                loop = asyncio.get_running_loop()
-                await loop.run_in_executor(executor, run_bet_processing, domain_id)
-
+                if domain_id in in_progress:
+                    response_text += "\n⏳ A re-check is already running."
+                else:
+                    in_progress.add(domain_id)
+                    reprocess = (domain_id, response_text)
+                    response_text += "\n⏳ Re-checking the bid..."
             else:
-                response_text = f"❌ Failed to update bet. Server error: {response.text}"
+                response_text = f"❌ Failed to update bet. Bet for {domain_name} not found."
 
         elif action == "cancel":
             domain_id = int(parts[1])
-            response = requests.post(f"{BASE_URL}/delete-bet/{domain_id}/")
-            response_text = f"🗑 Bet deleted." if response.status_code == 200 else f"❌ Delete failed: {response.text}"
+            deleted, _ = await Bet.objects.filter(domain_id=domain_id).adelete()
+            response_text = f"🗑 Bet deleted." if deleted else f"❌ Delete failed: bet not found."
 
         # Send response to user
-        await callback_query.message.edit_text(response_text, reply_markup=None)
-        await callback_query.answer()
+        status_message = callback_query.message
+        try:
+            if callback_query.message.text.startswith(DIGEST_TITLE) and domain_id is not None:
+                # other domains of a digest keep their buttons, the answer goes into a reply
+                await callback_query.message.edit_reply_markup(
+                    reply_markup=without_domain_buttons(callback_query.message.reply_markup, domain_id)
+                )
+                status_message = await callback_query.message.reply(response_text)
+            else:
+                await callback_query.message.edit_text(response_text, reply_markup=None)
+            await callback_query.answer()
+        finally:
+            if reprocess:
+                schedule_reprocessing(status_message, *reprocess)
 
     except Exception as e:
         logger.error(f"Callback handler error: {e}", exc_info=True)
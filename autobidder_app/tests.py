@@ -0,0 +1,856 @@
+import asyncio
+import gzip
+import logging
+import os
+import socket
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from unittest import mock
+
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils.timezone import now
+
+from autobidder_app.benchmarks.voodoo_standin import BID_PATH, FIXTURES_DIR, LISTING_PATH, MIN_BID, VoodooStandin
+from autobidder_app.management.commands import ahrefs_data, make_bets, voodoo_parse
+from autobidder_app.management.commands.ahrefs_data import AHREFS_DATA_FIELDS, AhrefsDataUpdater, AhrefsFetcher, is_complete
+from autobidder_app.management.commands.bid_scheduler import BidScheduler, next_check_time
+from autobidder_app.management.commands.make_bets import AsyncBetProcessor
+from autobidder_app.management.commands.voodoo_parse import DomainUpserter, get_domains_from_rows, run_parser
+from autobidder_app.models import AhrefsData, AhrefsLookup, AhrefsResponse, Bet, BidAttempt, Domain, OutbidAlert
+from autobidder_app.utils import ahrefs_balance, ahrefs_cache, ahrefs_lookup, html_extract, notification, voodoo_log_in
+from autobidder_app.utils.ahrefs_balance import BALANCE_RESERVE, rows_left
+from autobidder_app.utils.ahrefs_query import decode_cursor, encode_cursor, keyset_page
+from autobidder_app.utils.domain_prefilter import prefilter_reason
+from autobidder_app.utils import log_reader
+from autobidder_app.utils.log_reader import read_log_page
+from autobidder_app.utils.logger import DailyFileHandler
+from autobidder_app.utils.rate_limit import TokenBucket
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+class RecordingDispatcher:
+    """Stands in for NotificationDispatcher, keeps the alerts instead of sending them to Telegram."""
+
+    def __init__(self):
+        self.alerts = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    def enqueue(self, domain_name, current_bet, max_bet, domain_id):
+        self.alerts.append((domain_name, current_bet, max_bet, domain_id))
+
+
+class StandinPipelineTests(TransactionTestCase):
+    """voodoo_parse -> make_bets against the Voodoo stand-in, the bids run in worker threads."""
+
+    WON, MISSED, OVER_MAX = 1_500_000_001, 1_500_000_002, 1_500_000_003
+    MAX_BET = 1000
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+
+        self.port = free_port()
+        base_url = f"http://localhost:{self.port}"
+        for patcher in (
+            mock.patch.dict(os.environ, {"VOODOO_USERNAME": "tester", "VOODOO_PASSWORD": "secret"}),
+            mock.patch.object(voodoo_log_in, "LOGIN_URL", f"{base_url}/uk/accounts/ajax/auth"),
+            mock.patch.object(voodoo_log_in, "SESSION_FILE", os.path.join(tmp_dir.name, "session.json")),
+            mock.patch.object(voodoo_parse, "BASE_URL", f"{base_url}{LISTING_PATH}"),
+            mock.patch.object(make_bets, "BID_URL_TEMPLATE", f"{base_url}{BID_PATH}?backorder_domain_id="),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def start_standin(self):
+        expiration = (now() + timedelta(minutes=30)).replace(microsecond=0)
+        self.standin = VoodooStandin(
+            [
+                (self.WON, "won.com.ua", expiration),
+                (self.MISSED, "missed.com.ua", expiration),
+                (self.OVER_MAX, "over-max.com.ua", expiration),
+            ],
+            latency=0,
+            competitor_rate=0,
+        )
+        self.standin.start("localhost", self.port)
+        self.addCleanup(self.standin.stop)
+
+    def create_bets(self):
+        Bet.objects.bulk_create([
+            Bet(domain=domain, expiration_date=domain.expiration_date, max_bet=self.MAX_BET)
+            for domain in Domain.objects.all()
+        ])
+
+    def process_bets(self):
+        """One make_bets round over all bets, returns the alerts it would send."""
+        processor = AsyncBetProcessor(rate_per_host=0)
+        bets = list(Bet.objects.select_related("domain"))
+        notifications = RecordingDispatcher()
+        with mock.patch.object(make_bets, "NotificationDispatcher", return_value=notifications):
+            asyncio.run(processor.process_bets_async(bets))
+        return notifications.alerts
+
+    def end_auction(self, domain_id):
+        self.standin.auctions[domain_id].expiration_date = now() - timedelta(seconds=1)
+
+    def test_parse_then_bid(self):
+        self.start_standin()
+        self.assertEqual(run_parser()["status"], "success")
+        self.assertEqual(
+            set(Domain.objects.values_list("domain_id", "name")),
+            {(self.WON, "won.com.ua"), (self.MISSED, "missed.com.ua"), (self.OVER_MAX, "over-max.com.ua")},
+        )
+        self.create_bets()
+
+        self.end_auction(self.MISSED)  # ended before the bidder got to it
+        self.standin.auctions[self.OVER_MAX].price = 5000  # a competitor is above our max_bet
+        alerts = self.process_bets()
+
+        results = dict(BidAttempt.objects.values_list("domain_id", "result"))
+        self.assertEqual(results, {self.WON: "bid_placed", self.MISSED: "ended", self.OVER_MAX: "outbid"})
+        self.assertEqual(BidAttempt.objects.get(domain_id=self.WON).our_bid, MIN_BID)
+
+        # the ended auction is forgotten, the lost one is reported with the bid we would need
+        self.assertFalse(Bet.objects.filter(domain_id=self.MISSED).exists())
+        self.assertEqual(alerts, [("over-max.com.ua", 5100, self.MAX_BET, self.OVER_MAX)])
+        self.assertEqual(self.standin.bids_accepted, 1)
+
+        for domain_id in self.standin.auctions:
+            self.end_auction(domain_id)
+        self.assertEqual(self.standin.results(), (1, 2))
+
+    def test_login_form_is_not_read_as_a_bid_page(self):
+        self.start_standin()
+        self.assertEqual(run_parser()["status"], "success")
+        self.create_bets()
+        self.standin.session_ttl = 0  # every session expires at once, logging in again does not help
+
+        self.assertEqual(self.process_bets(), [])
+        self.assertEqual(set(BidAttempt.objects.values_list("result", flat=True)), {"error"})
+        self.assertEqual(self.standin.bids_accepted, 0)
+
+
+class NextCheckTimeTests(SimpleTestCase):
+    """The closer the deadline, the more often, without jumping over the start of a faster cadence."""
+
+    def check_in(self, time_left):
+        current_time = now()
+        return next_check_time(current_time + time_left, current_time) - current_time
+
+    def test_far_from_expiration(self):
+        self.assertEqual(self.check_in(timedelta(hours=3)), timedelta(hours=2))
+
+    def test_cadence(self):
+        self.assertEqual(self.check_in(timedelta(minutes=40)), timedelta(minutes=10))
+        self.assertEqual(self.check_in(timedelta(minutes=5)), timedelta(minutes=1))
+        self.assertEqual(self.check_in(timedelta(minutes=1)), timedelta(seconds=5))
+
+    def test_stops_at_the_faster_cadence(self):
+        self.assertEqual(self.check_in(timedelta(minutes=15)), timedelta(minutes=5))
+        self.assertEqual(self.check_in(timedelta(seconds=150)), timedelta(seconds=30))
+
+    def test_expired(self):
+        self.assertEqual(self.check_in(-timedelta(minutes=1)), timedelta(seconds=5))  # dates are approximate
+        self.assertEqual(self.check_in(-timedelta(minutes=30)), timedelta(minutes=10))
+
+
+class BidSchedulerTests(TestCase):
+
+    def setUp(self):
+        self.domain = Domain.objects.create(
+            domain_id=1_600_000_001, name="scheduled.com.ua", expiration_date=now() + timedelta(minutes=30)
+        )
+        Bet.objects.create(domain=self.domain, expiration_date=self.domain.expiration_date, max_bet=1000)
+        self.scheduler = BidScheduler(concurrency=2, rate_per_host=0)
+
+    def refresh(self):
+        async_to_sync(self.scheduler.refresh)()
+
+    def test_new_bet_is_scheduled_at_once(self):
+        self.refresh()
+        self.assertLessEqual(self.scheduler.scheduled[self.domain.domain_id], now())
+
+        self.scheduler.collect_due(now())
+        self.assertEqual(self.scheduler.ready, [(self.domain.expiration_date, self.domain.domain_id)])
+
+    def test_stale_entries_are_dropped(self):
+        self.refresh()
+        bet = self.scheduler.bets[self.domain.domain_id]
+        later = now() + timedelta(minutes=5)
+        self.scheduler.schedule_check(self.domain.domain_id, bet, later)
+
+        self.scheduler.collect_due(later)
+        self.assertEqual(len(self.scheduler.ready), 1)
+
+    def test_relisted_auction_is_rescheduled(self):
+        self.refresh()
+        self.scheduler.processor.ended.add(self.domain.domain_id)
+        del self.scheduler.scheduled[self.domain.domain_id]
+
+        self.refresh()  # nothing changed, the auction stays ended
+        self.assertNotIn(self.domain.domain_id, self.scheduler.scheduled)
+
+        Domain.objects.filter(pk=self.domain.pk).update(expiration_date=now() + timedelta(days=3))
+        self.refresh()
+        self.assertNotIn(self.domain.domain_id, self.scheduler.processor.ended)
+        self.assertIn(self.domain.domain_id, self.scheduler.scheduled)
+
+    def test_deleted_bet_is_forgotten(self):
+        self.refresh()
+        Bet.objects.filter(domain=self.domain).delete()
+        self.refresh()
+        self.assertEqual(self.scheduler.bets, {})
+        self.assertEqual(self.scheduler.scheduled, {})
+
+
+class DomainUpserterTests(TestCase):
+
+    def test_upsert_and_bet_expiration_sync(self):
+        old_expiration = now().replace(microsecond=0) + timedelta(days=1)
+        domain = Domain.objects.create(domain_id=1_600_000_101, name="old-name.com.ua", expiration_date=old_expiration)
+        Bet.objects.create(domain=domain, expiration_date=old_expiration, max_bet=1000)
+
+        new_expiration = old_expiration + timedelta(days=2)
+        upserter = DomainUpserter(batch_size=10)
+        upserter.add([(1_600_000_101, "new-name.com.ua", new_expiration), (1_600_000_102, "added.com.ua", new_expiration)])
+        upserter.flush()
+
+        self.assertEqual(
+            set(Domain.objects.values_list("domain_id", "name", "expiration_date")),
+            {(1_600_000_101, "new-name.com.ua", new_expiration), (1_600_000_102, "added.com.ua", new_expiration)},
+        )
+        self.assertEqual(Bet.objects.get(domain=domain).expiration_date, new_expiration)
+        self.assertEqual(upserter.saved, 2)
+        self.assertEqual(upserter.pending, {})
+
+    def test_flushes_when_the_batch_is_full(self):
+        expiration = now() + timedelta(days=1)
+        upserter = DomainUpserter(batch_size=2)
+        upserter.add([(1_600_000_111, "a.com.ua", expiration)])
+        self.assertFalse(Domain.objects.exists())
+        upserter.add([(1_600_000_112, "b.com.ua", expiration)])
+        self.assertEqual(Domain.objects.count(), 2)
+
+    def test_malformed_rows_are_skipped(self):
+        rows = [
+            ("1600000121", "good.com.ua", "≈ 10.02.2025 17:06:23"),
+            ("abc", "bad-id.com.ua", "10.02.2025 17:06:23"),
+            (None, "no-id.com.ua", "10.02.2025 17:06:23"),
+            ("1600000122", None, "10.02.2025 17:06:23"),
+        ]
+        self.assertEqual([(domain_id, name) for domain_id, name, _ in get_domains_from_rows(rows)],
+                         [(1_600_000_121, "good.com.ua")])
+
+
+class AhrefsFetcherTests(SimpleTestCase):
+    """AhrefsFetcher against a local server answering with the queued statuses per endpoint."""
+
+    RESPONSES = {
+        "domain_rating": {"domain": {"domain_rating": 42.7, "ahrefs_top": 7}},
+        "metrics_extended": {"metrics": {"backlinks": 10, "refdomains": 3}},
+    }
+
+    def setUp(self):
+        self.statuses = {"domain_rating": [200], "metrics_extended": [200]}
+        self.requests = []
+        for patcher in (
+            mock.patch.dict(os.environ, {"AHREFS_API": "token"}),
+            mock.patch.object(ahrefs_data, "BACKOFF_BASE", 0),
+            mock.patch.object(ahrefs_data, "AHREFS_MAX_RETRIES", 2),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def respond(self, request):
+        endpoint = request.query["from"]
+        self.requests.append(endpoint)
+        statuses = self.statuses[endpoint]
+        status = statuses.pop(0) if len(statuses) > 1 else statuses[0]
+        if status != 200:
+            return web.Response(status=status)
+        return web.json_response(self.RESPONSES[endpoint])
+
+    def fetch(self, domain="example.com.ua"):
+        async def run():
+            app = web.Application()
+            app.router.add_get("/", self.respond)
+            async with TestServer(app) as server:
+                with mock.patch.object(ahrefs_data, "AHREFS_API_URL", str(server.make_url("/"))):
+                    fetcher = AhrefsFetcher(requests_per_second=0, use_cache=False)
+                    async with fetcher.create_session() as session:
+                        return await fetcher.fetch_data(session, domain)
+
+        return asyncio.run(run())
+
+    def test_retries_server_errors(self):
+        self.statuses["domain_rating"] = [503, 429, 200]
+        data = self.fetch()
+
+        self.assertTrue(is_complete(data))
+        self.assertEqual((data["domain_rating"], data["ahrefs_top"]), (42, 7))
+        self.assertEqual((data["backlinks"], data["ref_domains"], data["pages"]), (10, 3, 0))
+        self.assertEqual(self.requests.count("domain_rating"), 3)
+
+    def test_client_error_is_not_retried(self):
+        self.statuses["metrics_extended"] = [400]
+        data = self.fetch()
+
+        self.assertEqual(self.requests.count("metrics_extended"), 1)
+        self.assertEqual(data, {"domain_rating": 42, "ahrefs_top": 7})
+        self.assertFalse(is_complete(data))
+
+    def test_gives_up_after_the_retries(self):
+        self.statuses = {"domain_rating": [503], "metrics_extended": [503]}
+        self.assertIsNone(self.fetch())
+        self.assertEqual(self.requests.count("domain_rating"), 3)  # AHREFS_MAX_RETRIES + 1
+
+    def test_is_complete(self):
+        complete = dict.fromkeys(AHREFS_DATA_FIELDS, 0)
+        self.assertTrue(is_complete(complete))
+        self.assertFalse(is_complete(None))
+        self.assertFalse(is_complete({}))
+        self.assertFalse(is_complete({key: value for key, value in complete.items() if key != "backlinks"}))
+
+
+class AhrefsCacheTests(TestCase):
+
+    def store(self, *targets, units=5):
+        ahrefs_cache.save_responses({("metrics", target): (units, {"target": target}) for target in targets}, [])
+
+    def test_fresh_entries_are_hits(self):
+        self.store("cached.com.ua")
+        cached = ahrefs_cache.load_responses(["metrics"], ["cached.com.ua", "missing.com.ua"])
+        self.assertEqual(list(cached), [("metrics", "cached.com.ua")])
+
+        pk, response = cached[("metrics", "cached.com.ua")]
+        self.assertEqual(response, {"target": "cached.com.ua"})
+        ahrefs_cache.save_responses({}, [pk])
+        self.assertEqual(ahrefs_cache.cache_stats(), {"entries": 1, "hits": 1, "units_saved": 5})
+
+    def test_expired_entries_are_missed_and_evicted(self):
+        self.store("stale.com.ua", "fresh.com.ua")
+        AhrefsResponse.objects.filter(target="stale.com.ua").update(fetched_at=now() - ahrefs_cache.AHREFS_CACHE_TTL)
+
+        cached = ahrefs_cache.load_responses(["metrics"], ["stale.com.ua", "fresh.com.ua"])
+        self.assertEqual(list(cached), [("metrics", "fresh.com.ua")])
+        self.assertEqual(ahrefs_cache.evict(), 1)
+        self.assertFalse(AhrefsResponse.objects.filter(target="stale.com.ua").exists())
+
+    def test_least_recently_used_are_evicted(self):
+        self.store("first.com.ua", "second.com.ua", "third.com.ua")
+        start = now() - timedelta(minutes=10)
+        for minutes, target in enumerate(["second.com.ua", "first.com.ua", "third.com.ua"]):
+            AhrefsResponse.objects.filter(target=target).update(last_used_at=start + timedelta(minutes=minutes))
+
+        self.assertEqual(ahrefs_cache.evict(max_entries=2), 1)
+        self.assertCountEqual(AhrefsResponse.objects.values_list("target", flat=True), ["first.com.ua", "third.com.ua"])
+
+    def test_refetched_entry_keeps_hits(self):
+        self.store("again.com.ua")
+        pk, _ = ahrefs_cache.load_responses(["metrics"], ["again.com.ua"])[("metrics", "again.com.ua")]
+        ahrefs_cache.save_responses({}, [pk])
+        self.store("again.com.ua", units=7)
+
+        entry = AhrefsResponse.objects.get(target="again.com.ua")
+        self.assertEqual((entry.hits, entry.units), (1, 7))
+
+
+class StaleLookupTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(ahrefs_lookup, "_last_stale_check", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def lookup(self, status, created_ago, updated_ago):
+        lookup = AhrefsLookup.objects.create(total=10, status=status)
+        AhrefsLookup.objects.filter(pk=lookup.pk).update(created_at=now() - created_ago, updated_at=now() - updated_ago)
+        return lookup
+
+    def statuses(self, *lookups):
+        return [AhrefsLookup.objects.get(pk=lookup.pk).status for lookup in lookups]
+
+    def test_running_lookup_times_out_without_progress(self):
+        moving = self.lookup("running", timedelta(hours=2), timedelta(minutes=1))
+        stalled = self.lookup("running", timedelta(minutes=30), ahrefs_lookup.LOOKUP_TIMEOUT + timedelta(minutes=1))
+        ahrefs_lookup.fail_stale_lookups()
+        self.assertEqual(self.statuses(moving, stalled), ["running", "failed"])
+
+    def test_queued_lookup_waits_for_the_queue_timeout(self):
+        queued = self.lookup("pending", ahrefs_lookup.LOOKUP_TIMEOUT * 2, ahrefs_lookup.LOOKUP_TIMEOUT * 2)
+        lost = self.lookup("pending", ahrefs_lookup.LOOKUP_QUEUE_TIMEOUT + timedelta(minutes=1), timedelta(0))
+        ahrefs_lookup.fail_stale_lookups()
+        self.assertEqual(self.statuses(queued, lost), ["pending", "failed"])
+
+    def test_check_is_throttled(self):
+        ahrefs_lookup.fail_stale_lookups()
+        stalled = self.lookup("running", timedelta(hours=1), timedelta(hours=1))
+        with self.assertNumQueries(0):
+            ahrefs_lookup.fail_stale_lookups()
+        self.assertEqual(self.statuses(stalled), ["running"])
+
+        ahrefs_lookup._last_stale_check -= ahrefs_lookup.STALE_CHECK_INTERVAL
+        ahrefs_lookup.fail_stale_lookups()
+        self.assertEqual(self.statuses(stalled), ["failed"])
+
+
+class AhrefsDataUpdaterTests(TestCase):
+    """update_ahrefs_data with a stub fetcher, every domain is paid from an unknown balance."""
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.checkpoint_file = os.path.join(tmp_dir.name, "checkpoint.json")
+        for patcher in (
+            mock.patch.dict(os.environ, {"AHREFS_API": "token"}),
+            mock.patch.object(ahrefs_data, "CHECKPOINT_FILE", self.checkpoint_file),
+            mock.patch.object(ahrefs_data, "check_api_limit", return_value={}),
+            mock.patch.object(ahrefs_data, "prefilter_reason", return_value=None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.start = now().replace(microsecond=0) + timedelta(hours=1)
+        self.fetched = []
+        self.partial = set()  # domains answered without their metrics
+
+    def create_domains(self, count):
+        return [
+            Domain.objects.create(domain_id=1_600_000_200 + i, name=f"pending-{i}.com.ua",
+                                  expiration_date=self.start + timedelta(hours=i))
+            for i in range(count)
+        ]
+
+    async def fetch_all(self, domains):
+        self.fetched.append(list(domains))
+        complete = dict.fromkeys(AHREFS_DATA_FIELDS, 1)
+        return [{"domain_rating": 1} if domain in self.partial else complete for domain in domains]
+
+    def update(self, chunk_size=2, resume=True):
+        updater = AhrefsDataUpdater(use_cache=False)
+        updater.fetcher.fetch_all = self.fetch_all
+        async_to_sync(updater.update_ahrefs_data)(chunk_size=chunk_size, resume=resume)
+        return updater
+
+    def names(self, chunks):
+        return [[int(name.split("-")[1].split(".")[0]) for name in chunk] for chunk in chunks]
+
+    def checkpoint_of(self, domain):
+        return AhrefsDataUpdater.load_checkpoint() == (domain.expiration_date, domain.domain_id)
+
+    def test_interrupted_run_resumes_after_the_last_chunk(self):
+        domains = self.create_domains(5)
+        fetch_all = self.fetch_all
+
+        async def crash_on_second_chunk(chunk):
+            if len(self.fetched) == 1:
+                raise RuntimeError("interrupted")
+            return await fetch_all(chunk)
+
+        self.fetch_all = crash_on_second_chunk
+        with self.assertRaises(RuntimeError):
+            self.update()
+        # the first chunk is committed and remembered
+        self.assertEqual(AhrefsData.objects.count(), 2)
+        self.assertTrue(self.checkpoint_of(domains[1]))
+
+        self.fetch_all, self.fetched = fetch_all, []
+        self.update()
+        self.assertEqual(self.names(self.fetched), [[2, 3], [4]])
+        self.assertEqual(AhrefsData.objects.count(), 5)
+        self.assertFalse(os.path.exists(self.checkpoint_file))
+
+    def test_nearest_expiration_first_and_ended_auctions_skipped(self):
+        domains = self.create_domains(4)
+        Domain.objects.filter(pk=domains[3].pk).update(expiration_date=self.start - timedelta(minutes=30))
+        Domain.objects.filter(pk=domains[1].pk).update(expiration_date=now() - timedelta(minutes=1))
+        self.update(chunk_size=10)
+        self.assertEqual(self.names(self.fetched), [[3, 0, 2]])
+
+    def test_resumed_run_wraps_around_to_the_checkpoint(self):
+        domains = self.create_domains(5)
+        AhrefsData.objects.create(domain=domains[1])
+        AhrefsDataUpdater.save_checkpoint((domains[2].expiration_date, domains[2].domain_id))
+        # moved before the checkpoint while the run was down
+        Domain.objects.filter(pk=domains[4].pk).update(expiration_date=self.start - timedelta(minutes=30))
+
+        self.update()
+        self.assertEqual(self.names(self.fetched), [[3], [4, 0], [2]])
+        self.assertEqual(AhrefsData.objects.count(), 5)
+        self.assertFalse(os.path.exists(self.checkpoint_file))
+
+    def test_restart_ignores_the_checkpoint(self):
+        domains = self.create_domains(3)
+        AhrefsDataUpdater.save_checkpoint((domains[1].expiration_date, domains[1].domain_id))
+        self.update(resume=False)
+        self.assertEqual(self.names(self.fetched), [[0, 1], [2]])
+
+    def test_partial_results_stay_pending(self):
+        self.create_domains(3)
+        self.partial = {"pending-1.com.ua"}
+        self.update()
+
+        self.assertEqual(set(AhrefsData.objects.values_list("domain__name", flat=True)),
+                         {"pending-0.com.ua", "pending-2.com.ua"})
+        self.assertEqual(list(AhrefsDataUpdater.pending_domains().values_list("name", flat=True)),
+                         ["pending-1.com.ua"])
+
+    def test_balance_shrinks_the_chunk_and_stops_the_run(self):
+        domains = self.create_domains(5)
+
+        def balance(max_age=None):
+            # pays for 3 domains above the reserve, then the stub fetch spends it
+            left = BALANCE_RESERVE + 1 + (0 if self.fetched else 3 * ahrefs_data.UNITS_PER_DOMAIN)
+            return {"info": {"rows_left": left}}
+
+        with mock.patch.object(ahrefs_data, "check_api_limit", side_effect=balance):
+            self.update(chunk_size=10)
+        self.assertEqual(self.names(self.fetched), [[0, 1, 2]])
+        self.assertEqual(AhrefsData.objects.count(), 3)
+        self.assertTrue(self.checkpoint_of(domains[2]))
+
+        self.fetched = []
+        self.update(chunk_size=10)
+        self.assertEqual(self.names(self.fetched), [[3, 4]])
+        self.assertFalse(os.path.exists(self.checkpoint_file))
+
+
+class AhrefsBalanceTests(SimpleTestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        patcher = mock.patch.object(ahrefs_balance, "BALANCE_FILE", os.path.join(tmp_dir.name, "balance.json"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_spent_units_are_taken_off_the_cached_balance(self):
+        ahrefs_balance.save_balance({"info": {"rows_left": 10}, "fetched_at": time.time()})
+        ahrefs_balance.spend_units(4)
+        self.assertEqual(rows_left(ahrefs_balance.check_api_limit()), 6)
+        ahrefs_balance.spend_units(8)
+        self.assertEqual(rows_left(ahrefs_balance.load_balance()), 0)
+
+    def test_unknown_balance_stays_unknown(self):
+        ahrefs_balance.spend_units(4)
+        self.assertIsNone(ahrefs_balance.load_balance())
+
+
+class HtmlExtractTests(SimpleTestCase):
+    """Both extractors against the saved Voodoo markup."""
+
+    def extractors(self):
+        yield html_extract.BeautifulSoupExtractor()
+        if html_extract.lxml_html is not None:
+            yield html_extract.LxmlExtractor()
+
+    def read_fixture(self, name):
+        return (FIXTURES_DIR / name).read_text(encoding="utf-8")
+
+    def test_listing(self):
+        for extractor in self.extractors():
+            with self.subTest(extractor=extractor.name):
+                total_pages, rows = extractor.parse_listing(self.read_fixture("listing_page.html"))
+                self.assertEqual(total_pages, 7)
+                self.assertEqual(len(rows), 100)
+                self.assertEqual(rows[0], ("21246000", "foodtravel.com.ua", "≈ 10.02.2025 17:06:23"))
+
+    def test_bid_page(self):
+        for extractor in self.extractors():
+            with self.subTest(extractor=extractor.name):
+                self.assertEqual(extractor.parse_bid_page(self.read_fixture("bid_page.html")), (False, 1200, 1300))
+
+    def test_ended_bid_page(self):
+        for extractor in self.extractors():
+            with self.subTest(extractor=extractor.name):
+                self.assertEqual(extractor.parse_bid_page(self.read_fixture("bid_page_ended.html")), (True, None, None))
+
+    def test_empty_page(self):
+        for extractor in self.extractors():
+            with self.subTest(extractor=extractor.name):
+                self.assertEqual(extractor.parse_listing(""), (1, []))
+                self.assertEqual(extractor.parse_bid_page(""), (False, None, None))
+
+    def test_amounts(self):
+        self.assertEqual(html_extract.to_int("1\xa0200"), 1200)
+        self.assertIsNone(html_extract.to_int(""))
+        self.assertEqual(html_extract.extract_bid_value("Ставка від 1300 до 50000 грн"), 1300)
+        self.assertIsNone(html_extract.extract_bid_value(None))
+
+
+class TokenBucketTests(SimpleTestCase):
+
+    def test_burst_then_rate(self):
+        async def take(bucket, count):
+            started = time.monotonic()
+            for _ in range(count):
+                await bucket.acquire()
+            return time.monotonic() - started
+
+        # 2 tokens of burst, then one token every 1/20 s
+        elapsed = asyncio.run(take(TokenBucket(20, capacity=2), 6))
+        self.assertGreaterEqual(elapsed, 0.19)
+        self.assertLess(elapsed, 1)
+
+    def test_no_limit(self):
+        async def take():
+            bucket = TokenBucket(0)
+            for _ in range(1000):
+                await bucket.acquire()
+
+        started = time.monotonic()
+        asyncio.run(take())
+        self.assertLess(time.monotonic() - started, 0.5)
+
+
+class NotificationDispatcherTests(SimpleTestCase):
+
+    def test_dispatcher_per_event_loop(self):
+        """Bet workers each run their own loop, every dispatcher sends over and closes its own session."""
+        async def dispatch(domain_id):
+            dispatcher = notification.NotificationDispatcher(batch_window=0)
+            async with dispatcher:
+                dispatcher.enqueue(f"worker-{domain_id}.com.ua", 200, 100, domain_id)
+            return dispatcher.bot
+
+        send_message = mock.AsyncMock()
+        with mock.patch.object(notification, "due_alerts", side_effect=lambda alerts: alerts), \
+                mock.patch.object(notification, "record_alerts"), \
+                mock.patch.object(notification.Bot, "send_message", send_message), \
+                mock.patch.object(AiohttpSession, "close", autospec=True) as close:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                bots = list(executor.map(lambda domain_id: asyncio.run(dispatch(domain_id)), [1, 2]))
+
+        self.assertIsNot(bots[0], bots[1])
+        self.assertIsNot(bots[0].session, bots[1].session)
+        self.assertEqual(send_message.await_count, 2)
+        self.assertCountEqual([call.args[0] for call in close.await_args_list], [bot.session for bot in bots])
+
+
+class OutbidAlertTests(TestCase):
+
+    def setUp(self):
+        domain = Domain.objects.create(
+            domain_id=1_600_000_301, name="outbid.com.ua", expiration_date=now() + timedelta(hours=2)
+        )
+        self.bet = Bet.objects.create(domain=domain, expiration_date=domain.expiration_date, max_bet=1000)
+        self.alert = ("outbid.com.ua", 1100, 1000, domain.domain_id)
+
+    def test_same_bid_is_sent_once_per_cooldown(self):
+        self.assertEqual(notification.due_alerts([self.alert]), [self.alert])
+        notification.record_alerts([self.alert])
+        self.assertEqual(notification.due_alerts([self.alert]), [])
+
+        OutbidAlert.objects.filter(bet=self.bet).update(sent_at=now() - notification.ALERT_COOLDOWN)
+        self.assertEqual(notification.due_alerts([self.alert]), [self.alert])
+        notification.record_alerts([self.alert])
+        self.assertEqual(OutbidAlert.objects.get(bet=self.bet).times_sent, 2)
+
+    def test_new_competing_bid_is_sent(self):
+        notification.record_alerts([self.alert])
+        higher = ("outbid.com.ua", 1200, 1000, self.bet.domain_id)
+        self.assertEqual(notification.due_alerts([self.alert, higher]), [higher])
+
+    def test_deleted_bet_is_dropped(self):
+        self.bet.delete()
+        self.assertEqual(notification.due_alerts([self.alert]), [])
+        notification.record_alerts([self.alert])
+        self.assertFalse(OutbidAlert.objects.exists())
+
+    def test_max_bet_change_resets_alert(self):
+        notification.record_alerts([self.alert])
+        url = reverse("update_max_bet", args=[self.bet.domain_id])
+
+        self.client.post(url, {"max_bet": 1000})
+        self.assertTrue(OutbidAlert.objects.filter(bet=self.bet).exists())
+
+        self.client.post(url, {"max_bet": 1500})
+        self.assertFalse(OutbidAlert.objects.filter(bet=self.bet).exists())
+        self.assertEqual(notification.due_alerts([self.alert]), [self.alert])
+
+
+class AhrefsCursorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        expiration = now().replace(microsecond=0) + timedelta(days=1)
+        # duplicate ratings, so pages have to break ties by domain_id
+        for domain_id, rating in [(1, 10), (2, 30), (3, 10), (4, 20), (5, 10)]:
+            domain = Domain.objects.create(
+                domain_id=domain_id, name=f"d{domain_id}.com.ua", expiration_date=expiration + timedelta(hours=domain_id)
+            )
+            AhrefsData.objects.create(domain=domain, domain_rating=rating)
+
+    def walk(self, sort, order):
+        ids, cursor = [], None
+        while True:
+            rows, cursor = keyset_page(AhrefsData.objects.all(), sort, order, after=cursor, page_size=2)
+            ids += [row["domain__domain_id"] for row in rows]
+            if cursor is None:
+                return ids
+
+    def test_pages_follow_sort_and_domain_id(self):
+        self.assertEqual(self.walk("domain_rating", "asc"), [1, 3, 5, 4, 2])
+        self.assertEqual(self.walk("domain_rating", "desc"), [2, 4, 5, 3, 1])
+        self.assertEqual(self.walk("expiration_date", "asc"), [1, 2, 3, 4, 5])
+
+    def test_cursor_round_trip(self):
+        expiration = now().replace(microsecond=0)
+        row = {"domain__expiration_date": expiration, "domain_rating": 7, "domain__domain_id": 42}
+        self.assertEqual(decode_cursor("expiration_date", encode_cursor("expiration_date", row)), (expiration, 42))
+        self.assertEqual(decode_cursor("domain_rating", encode_cursor("domain_rating", row)), (7, 42))
+
+    def test_malformed_cursor(self):
+        for cursor in ("garbage", "abc|1", "10|x"):
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                decode_cursor("domain_rating", cursor)
+
+
+class LogReaderTests(SimpleTestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.directory = tmp_dir.name
+        self.start = datetime(2025, 2, 10, 12, 0, 0)
+
+    def line(self, seconds, message):
+        timestamp = (self.start + timedelta(seconds=seconds)).strftime("%Y-%m-%d %H:%M:%S")
+        return f"{timestamp} - INFO - {message}\n"
+
+    def write(self, name, lines, opener=open):
+        with opener(os.path.join(self.directory, name), "wt", encoding="utf-8") as f:
+            f.writelines(lines)
+
+    def read_all(self, query="", page_size=2):
+        texts, cursor = [], None
+        while True:
+            before, skip = cursor or (None, 0)
+            entries, cursor = read_log_page([self.directory], query=query, before=before, skip=skip,
+                                            page_size=page_size)
+            texts += [text for _, text in entries]
+            if cursor is None:
+                return texts
+
+    def test_pages_newest_first_across_files(self):
+        # three entries in the same second are split between pages
+        self.write("a_2025-02-10.log", [self.line(0, "a0"), self.line(2, "a2"), self.line(2, "a2b"), self.line(2, "a2c")])
+        self.write("b_2025-02-10.log", [self.line(1, "b1"), self.line(3, "b3")])
+
+        messages = [text.rsplit(" - ", 1)[1] for text in self.read_all()]
+        self.assertEqual(len(messages), 6)
+        self.assertEqual(messages[0], "b3")
+        self.assertEqual(sorted(messages[1:4]), ["a2", "a2b", "a2c"])
+        self.assertEqual(messages[4:], ["b1", "a0"])
+
+    def test_traceback_lines_stay_with_their_entry(self):
+        self.write("a_2025-02-10.log", [
+            self.line(0, "first"),
+            self.line(1, "failed"),
+            "Traceback (most recent call last):\n",
+            "ValueError: boom\n",
+        ])
+        texts = self.read_all()
+        self.assertEqual(len(texts), 2)
+        self.assertTrue(texts[0].endswith("failed\nTraceback (most recent call last):\nValueError: boom"))
+
+    def test_query_and_compressed_days(self):
+        self.write("a_2025-02-09.log.gz", [self.line(-60, "old match"), self.line(-30, "old other")], gzip.open)
+        self.write("a_2025-02-10.log", [self.line(0, "new match"), self.line(1, "new other")])
+
+        texts = self.read_all(query="match", page_size=1)
+        self.assertEqual([text.rsplit(" - ", 1)[1] for text in texts], ["new match", "old match"])
+        self.assertTrue(texts[1].startswith("a_2025-02-09.log.gz: "))
+
+
+    def test_compressed_day_is_read_only_when_reached(self):
+        self.write("a_2025-02-09.log.gz", [self.line(-60, "old")], gzip.open)
+        self.write("a_2025-02-10.log", [self.line(0, "new 0"), self.line(1, "new 1"), self.line(2, "new 2")])
+
+        with mock.patch.object(log_reader.gzip, "open", wraps=gzip.open) as gzip_open:
+            entries, cursor = read_log_page([self.directory], page_size=1)
+            read_log_page([self.directory], page_size=1)
+            self.assertEqual(gzip_open.call_count, 1)  # its time range, indexed once
+
+            # a page stops one entry after its last one, "new 0" is still newer than the whole day
+            entries, cursor = read_log_page([self.directory], before=cursor[0], skip=cursor[1], page_size=1)
+            self.assertEqual(gzip_open.call_count, 1)
+
+            entries, _ = read_log_page([self.directory], before=cursor[0], skip=cursor[1], page_size=5)
+            self.assertEqual(gzip_open.call_count, 2)
+        self.assertTrue(entries[-1][1].endswith("old"))
+
+    def test_compressed_day_after_the_cursor_is_skipped(self):
+        self.write("a_2025-02-11.log.gz", [self.line(86400, "later")], gzip.open)
+        self.write("a_2025-02-10.log", [self.line(0, "new 0"), self.line(1, "new 1")])
+
+        with mock.patch.object(log_reader, "read_compressed_entries_backwards") as read_compressed:
+            entries, _ = read_log_page([self.directory], before=self.start + timedelta(seconds=1), page_size=5)
+        read_compressed.assert_not_called()
+        self.assertEqual(len(entries), 2)
+
+
+class DailyFileHandlerTests(SimpleTestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.directory = tmp_dir.name
+
+        self.old_file = os.path.join(self.directory, "test_2000-01-01.log")
+        with open(self.old_file, "w") as f:
+            f.write("old\n")
+        old_time = time.time() - 30 * 86400
+        os.utime(self.old_file, (old_time, old_time))
+
+    def test_retention_at_the_day_switch_only(self):
+        handler = DailyFileHandler(self.directory, "test", days=7)
+        self.addCleanup(handler.close)
+        self.assertTrue(os.path.exists(self.old_file))  # nothing is scanned at setup
+
+        handler.date = "2000-01-02"  # as if the process had been running since then
+        handler.emit(logging.makeLogRecord({"msg": "after midnight", "levelno": logging.INFO}))
+
+        self.assertFalse(os.path.exists(self.old_file))
+        self.assertEqual(os.listdir(self.directory), [os.path.basename(handler.baseFilename)])
+        self.assertTrue(handler.baseFilename.endswith(f"test_{handler.date}.log"))
+
+
+class PrefilterTests(SimpleTestCase):
+
+    def test_no_limits(self):
+        self.assertIsNone(prefilter_reason("123-456-789.com", tlds=(), max_length=None, max_digits=None,
+                                           max_hyphens=None))
+
+    def test_tld(self):
+        self.assertEqual(prefilter_reason("shop.com", tlds=("com.ua", "ua")), "tld")
+        self.assertIsNone(prefilter_reason("Shop.COM.UA", tlds=(".com.ua",)))
+        self.assertEqual(prefilter_reason("shopcom.ua.com", tlds=("com.ua",)), "tld")
+
+    def test_limits_count_the_name_without_its_zone(self):
+        kwargs = {"tlds": (), "max_length": 10, "max_digits": 2, "max_hyphens": 1}
+        self.assertIsNone(prefilter_reason("my-shop12.com.ua", **kwargs))
+        self.assertEqual(prefilter_reason("averylongname.com.ua", **kwargs), "length")
+        self.assertEqual(prefilter_reason("shop123.com.ua", **kwargs), "digits")
+        self.assertEqual(prefilter_reason("a-b-c.com.ua", **kwargs), "hyphens")
+
+    def test_punycode_prefix_is_not_a_hyphen(self):
+        self.assertIsNone(prefilter_reason("xn--80ak6aa92e.com.ua", tlds=(), max_length=None, max_digits=None,
+                                           max_hyphens=0))
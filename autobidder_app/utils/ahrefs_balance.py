@@ -1,15 +1,100 @@
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+
 import requests
 from decouple import config
-from django.core.management import BaseCommand
 
+from autobidder_app.utils.logger import setup_logger
+
+# loggins
+logger = setup_logger("ahrefs_balance", log_directory="logs/ahrefs", days=7)
+
+BALANCE_FILE = config("AHREFS_BALANCE_FILE", default=".ahrefs_balance.json")  # shared by the site and the commands
+BALANCE_TTL = config("AHREFS_BALANCE_TTL", default=300, cast=int)  # seconds the cached balance is trusted
+BALANCE_TIMEOUT = 10
+BALANCE_RESERVE = config("AHREFS_BALANCE_RESERVE", default=100, cast=int)  # units the enrichment never spends
 
-def check_api_limit():
-    """Get api limits balance"""
+
+def fetch_api_limit():
+    """Get api limits balance from Ahrefs"""
     api_token = config("AHREFS_API")
     url = f"https://apiv2.ahrefs.com/?token={api_token}&from=subscription_info&output=json"
 
-    response = requests.get(url)  # Blocking request
+    try:
+        response = requests.get(url, timeout=BALANCE_TIMEOUT)
+    except requests.RequestException as e:
+        return {"error": f"Failed to fetch API limit ({e.__class__.__name__})"}
     if response.status_code != 200:
         return {"error": f"Failed to fetch API limit (status: {response.status_code})"}
 
     return response.json()
+
+
+def load_balance():
+    try:
+        with open(BALANCE_FILE) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable Ahrefs balance file: {e}")
+        return None
+
+
+@contextmanager
+def balance_lock():
+    """Exclusive lock for a read-modify-write of BALANCE_FILE, the site and the commands spend units at once."""
+    with open(f"{BALANCE_FILE}.lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)  # released when the file is closed
+        yield
+
+
+def save_balance(balance):
+    tmp_file = f"{BALANCE_FILE}.{os.getpid()}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(balance, f)
+    os.replace(tmp_file, BALANCE_FILE)
+
+
+def check_api_limit(max_age=BALANCE_TTL):
+    """
+    Api limits balance, cached in BALANCE_FILE for `max_age` seconds and decremented by spend_units()
+    in between. When Ahrefs can not be reached the last known balance is returned.
+    """
+    cached = load_balance()
+    if cached and time.time() - cached.get("fetched_at", 0) < max_age:
+        return cached
+
+    balance = fetch_api_limit()
+    if "error" in balance:
+        logger.warning(f"Ahrefs balance: {balance['error']}")
+        return cached or balance
+
+    balance["fetched_at"] = time.time()
+    with balance_lock():
+        save_balance(balance)
+    return balance
+
+
+def rows_left(balance):
+    """Units left in the balance, None when unknown."""
+    try:
+        return int(balance["info"]["rows_left"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def spend_units(units):
+    """Take spent units off the cached balance until the next fetch."""
+    if not units:
+        return
+    with balance_lock():
+        balance = load_balance()
+        left = rows_left(balance) if balance else None
+        if left is None:
+            return
+        balance["info"]["rows_left"] = max(0, left - units)
+        save_balance(balance)
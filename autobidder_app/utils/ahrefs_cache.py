@@ -0,0 +1,73 @@
+from datetime import timedelta
+
+from decouple import config
+from django.db.models import F, Sum
+from django.utils.timezone import now
+
+from autobidder_app.models import AhrefsResponse
+
+AHREFS_CACHE_TTL = timedelta(hours=config("AHREFS_CACHE_TTL", default=24, cast=int))  # 0 - cache disabled
+AHREFS_CACHE_MAX_ENTRIES = config("AHREFS_CACHE_MAX_ENTRIES", default=100_000, cast=int)
+LOOKUP_BATCH = 500  # targets per IN (...) query
+
+
+def load_responses(endpoints, targets):
+    """Fresh cached responses as {(endpoint, target): (pk, response)}."""
+    if not AHREFS_CACHE_TTL:
+        return {}
+    targets = list(targets)
+    cutoff = now() - AHREFS_CACHE_TTL
+    cached = {}
+    for i in range(0, len(targets), LOOKUP_BATCH):
+        rows = AhrefsResponse.objects.filter(
+            endpoint__in=endpoints, target__in=targets[i:i + LOOKUP_BATCH], fetched_at__gte=cutoff
+        ).values_list("pk", "endpoint", "target", "response")
+        for pk, endpoint, target, response in rows:
+            cached[(endpoint, target)] = (pk, response)
+    return cached
+
+
+def save_responses(responses, hit_pks):
+    """
+    Store new {(endpoint, target): (units, response)} responses and count the cache hits, then evict.
+
+    `hits` is kept when an expired entry is fetched again, so it sums up over the life of the key.
+    """
+    if not AHREFS_CACHE_TTL:
+        return
+    current_time = now()
+    if hit_pks:
+        AhrefsResponse.objects.filter(pk__in=hit_pks).update(hits=F("hits") + 1, last_used_at=current_time)
+    if responses:
+        AhrefsResponse.objects.bulk_create(
+            [
+                AhrefsResponse(endpoint=endpoint, target=target, response=response, units=units,
+                               fetched_at=current_time, last_used_at=current_time)
+                for (endpoint, target), (units, response) in responses.items()
+            ],
+            batch_size=LOOKUP_BATCH,
+            update_conflicts=True,
+            unique_fields=["endpoint", "target"],
+            update_fields=["response", "units", "fetched_at", "last_used_at"],
+        )
+    evict()
+
+
+def evict(max_entries=AHREFS_CACHE_MAX_ENTRIES):
+    """Drop expired entries, then the least recently used ones above `max_entries`. Returns how many were removed."""
+    removed, _ = AhrefsResponse.objects.filter(fetched_at__lt=now() - AHREFS_CACHE_TTL).delete()
+    excess = AhrefsResponse.objects.count() - max_entries
+    if excess > 0:
+        oldest = list(AhrefsResponse.objects.order_by("last_used_at").values_list("pk", flat=True)[:excess])
+        removed += AhrefsResponse.objects.filter(pk__in=oldest).delete()[0]
+    return removed
+
+
+def cache_stats():
+    """Entries, hits and API units saved over the cache's lifetime."""
+    totals = AhrefsResponse.objects.aggregate(total_hits=Sum("hits"), units_saved=Sum(F("hits") * F("units")))
+    return {
+        "entries": AhrefsResponse.objects.count(),
+        "hits": totals["total_hits"] or 0,
+        "units_saved": totals["units_saved"] or 0,
+    }
@@ -0,0 +1,125 @@
+import csv
+import io
+
+from decouple import config
+from django.utils.timezone import localtime
+
+from autobidder_app.utils.ahrefs_query import FIELD_NAMES, SORT_COLUMNS
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # optional, only the Parquet and Arrow exports need it
+    pyarrow = None
+
+EXPORT_CHUNK_SIZE = config("AHREFS_EXPORT_CHUNK_SIZE", default=5000, cast=int)  # rows per fetch, CSV chunk and record batch
+EXPORT_COLUMNS = ["domain_id", "domain", "expiration_date", *FIELD_NAMES]
+# file type -> (content type, extension)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+COLUMNAR_FORMATS = {"parquet", "arrow"}
+
+
+def export_rows(queryset, sort, order):
+    """Tuples in EXPORT_COLUMNS order, same order as the table, read through a server-side cursor."""
+    prefix = "-" if order == "desc" else ""
+    return queryset.order_by(f"{prefix}{SORT_COLUMNS[sort]}", f"{prefix}domain_id").values_list(
+        "domain__domain_id", "domain__name", "domain__expiration_date", *FIELD_NAMES
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def stream_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+
+    for count, (domain_id, name, expiration_date, *metrics) in enumerate(rows, 1):
+        writer.writerow([domain_id, name, localtime(expiration_date).isoformat(), *metrics])
+        if count % EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+class StreamSink:
+    """Write-only file for the pyarrow writers, written bytes are taken out with drain()."""
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.buffer.write(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+
+def export_schema():
+    return pyarrow.schema([
+        ("domain_id", pyarrow.int64()),
+        ("domain", pyarrow.string()),
+        ("expiration_date", pyarrow.timestamp("us", tz="UTC")),
+        *[(field, pyarrow.int64()) for field in FIELD_NAMES],
+    ])
+
+
+def to_record_batch(rows, schema):
+    columns = zip(*rows)
+    return pyarrow.RecordBatch.from_arrays(
+        [pyarrow.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+    )
+
+
+def record_batches(rows, schema):
+    """EXPORT_CHUNK_SIZE rows per batch, only one batch is in memory at a time."""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == EXPORT_CHUNK_SIZE:
+            yield to_record_batch(chunk, schema)
+            chunk = []
+    if chunk:
+        yield to_record_batch(chunk, schema)
+
+
+def stream_columnar(rows, file_type):
+    """Parquet (one row group per batch) or Arrow IPC stream."""
+    schema = export_schema()
+    sink = StreamSink()
+    if file_type == "parquet":
+        writer = pyarrow.parquet.ParquetWriter(sink, schema)
+    else:
+        writer = pyarrow.ipc.new_stream(sink, schema)
+
+    for batch in record_batches(rows, schema):
+        writer.write_batch(batch)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def stream_export(rows, file_type):
+    if file_type in COLUMNAR_FORMATS:
+        return stream_columnar(rows, file_type)
+    return stream_csv(rows)
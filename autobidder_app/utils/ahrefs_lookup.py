@@ -0,0 +1,116 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from decouple import config
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils.timezone import now
+
+from autobidder_app.management.commands.ahrefs_data import AHREFS_DATA_FIELDS, AhrefsFetcher
+from autobidder_app.models import AhrefsLookup, AhrefsLookupResult
+from autobidder_app.utils.logger import setup_logger
+
+# loggins
+logger = setup_logger("ahrefs_lookup", log_directory="logs/ahrefs", days=7)
+
+LOOKUP_WORKERS = config("AHREFS_LOOKUP_WORKERS", default=2, cast=int)  # lookups fetched at the same time
+LOOKUP_CHUNK_SIZE = 50  # domains saved, and progress reported, together
+LOOKUP_RETENTION = timedelta(days=config("AHREFS_LOOKUP_RETENTION_DAYS", default=7, cast=int))
+# a running lookup without progress for this long is failed, see fail_stale_lookups()
+LOOKUP_TIMEOUT = timedelta(minutes=config("AHREFS_LOOKUP_TIMEOUT_MINUTES", default=10, cast=int))
+# a lookup still queued this long after it was created is failed, it waits behind the running ones until then
+LOOKUP_QUEUE_TIMEOUT = timedelta(minutes=config("AHREFS_LOOKUP_QUEUE_TIMEOUT_MINUTES", default=60, cast=int))
+STALE_CHECK_INTERVAL = timedelta(minutes=1)  # fail_stale_lookups() runs at most this often per process
+_last_stale_check = None
+
+# lookups run outside of the request, a lookup queued or running when the process stops is lost
+executor = ThreadPoolExecutor(max_workers=LOOKUP_WORKERS, thread_name_prefix="ahrefs-lookup")
+
+
+def start_lookup(domains):
+    """Create the lookup and queue it, returns at once."""
+    AhrefsLookup.objects.filter(created_at__lt=now() - LOOKUP_RETENTION).delete()
+    lookup = AhrefsLookup.objects.create(total=len(domains))
+    executor.submit(run_lookup, lookup.pk, domains)
+    logger.info(f"Ahrefs lookup {lookup.pk} queued for {len(domains)} domains")
+    return lookup
+
+
+def run_lookup(lookup_id, domains):
+    """Runs in a lookup worker thread."""
+    close_old_connections()
+    try:
+        started = AhrefsLookup.objects.filter(pk=lookup_id, status="pending").update(status="running", updated_at=now())
+        if not started:
+            logger.warning(f"Ahrefs lookup {lookup_id} was failed or removed while queued, skipping")
+            return
+        asyncio.run(fetch_lookup(lookup_id, domains))
+        AhrefsLookup.objects.filter(pk=lookup_id).update(status="done", updated_at=now(), finished_at=now())
+        logger.info(f"Ahrefs lookup {lookup_id} done")
+    except Exception as e:
+        logger.error(f"Ahrefs lookup {lookup_id} failed: {e}", exc_info=True)
+        AhrefsLookup.objects.filter(pk=lookup_id).update(
+            status="failed", error=str(e), updated_at=now(), finished_at=now()
+        )
+    finally:
+        close_old_connections()
+
+
+async def fetch_lookup(lookup_id, domains):
+    fetcher = AhrefsFetcher()
+    for start in range(0, len(domains), LOOKUP_CHUNK_SIZE):
+        chunk = domains[start:start + LOOKUP_CHUNK_SIZE]
+        results = await fetcher.fetch_all(chunk)
+        await sync_to_async(save_results)(lookup_id, start, chunk, results)
+
+
+def save_results(lookup_id, start, domains, results):
+    AhrefsLookupResult.objects.bulk_create([
+        AhrefsLookupResult(lookup_id=lookup_id, position=start + i, domain=domain, data=data)
+        for i, (domain, data) in enumerate(zip(domains, results))
+    ])
+    AhrefsLookup.objects.filter(pk=lookup_id).update(done=F("done") + len(domains), updated_at=now())
+
+
+def fail_stale_lookups():
+    """
+    Fail lookups lost to a restart of the worker process, so their page stops polling.
+
+    Called on every progress poll, so the check itself runs at most once per STALE_CHECK_INTERVAL.
+    """
+    global _last_stale_check
+    current_time = now()
+    if _last_stale_check and current_time - _last_stale_check < STALE_CHECK_INTERVAL:
+        return
+    _last_stale_check = current_time
+
+    stopped = AhrefsLookup.objects.filter(status="running", updated_at__lt=current_time - LOOKUP_TIMEOUT).update(
+        status="failed",
+        error=f"No progress for {LOOKUP_TIMEOUT.total_seconds() / 60:g} minutes, the lookup was interrupted.",
+        updated_at=current_time,
+        finished_at=current_time,
+    )
+    lost = AhrefsLookup.objects.filter(status="pending", created_at__lt=current_time - LOOKUP_QUEUE_TIMEOUT).update(
+        status="failed",
+        error=f"Still queued after {LOOKUP_QUEUE_TIMEOUT.total_seconds() / 60:g} minutes, the lookup was lost.",
+        updated_at=current_time,
+        finished_at=current_time,
+    )
+    if stopped or lost:
+        logger.warning(f"Failed {stopped} stalled and {lost} lost Ahrefs lookup(s)")
+
+
+def lookup_rows(lookup):
+    """Results as dicts with the domain name under "domain", in the pasted order."""
+    return [
+        {**(data or {}), "domain": domain}
+        for domain, data in lookup.results.order_by("position").values_list("domain", "data")
+    ]
+
+
+def lookup_fields(rows):
+    """Metric fields present in the rows, in AhrefsData order."""
+    present = {key for row in rows for key in row}
+    return [field for field in AHREFS_DATA_FIELDS if field in present]
@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta
+
+from django.db.models import Q
+from django.utils.timezone import localtime, make_aware, now
+
+from autobidder_app.models import AhrefsData
+
+
+AHREFS_FIELDS = [
+    ('domain_rating', 'DR'),
+    ('ref_domains', 'Ref Dom'),
+    ('backlinks', 'BL'),
+    ('dofollow_links', 'DF Links'),
+    ('ahrefs_top', 'Top'),
+    ('alternate_links', 'Alt Links'),
+    ('canonical_links', 'CL'),
+    ('gov_links', 'Gov Links'),
+    ('edu_links', 'Edu Links'),
+    ('external_links', 'Ext Links'),
+    ('redirect_links', 'Redirects'),
+    ('sponsored_links', 'Spon Links'),
+    ('html_pages', 'HTML Pgs'),
+    ('image_links', 'Img Links'),
+    ('internal_links', 'Int Links'),
+    ('linked_root_domains', 'LRD'),
+    ('nofollow_links', 'NF Links'),
+    ('pages', 'Pgs'),
+    ('ref_class_c', 'Ref C-Class'),
+    ('ref_ips', 'Ref IPs'),
+    ('ref_pages', 'Ref Pgs'),
+    ('rss_links', 'RSS Links'),
+    ('text_links', 'Txt Links'),
+    ('ugc_links', 'UGC Links'),
+    ('valid_pages', 'Valid Pgs'),
+]
+FIELD_NAMES = [field for field, _ in AHREFS_FIELDS]
+
+FILTER_OPERATORS = {"greater": "gt", "equals": "exact", "less": "lt"}
+# sort parameter -> column in .values() rows
+SORT_COLUMNS = {"expiration_date": "domain__expiration_date", **{field: field for field in FIELD_NAMES}}
+DEFAULT_SORT = "expiration_date"
+PAGE_SIZE = 100
+
+
+def parse_date_range(params):
+    """Return (start_date_str, end_date_str, start, end), tomorrow by default."""
+    tomorrow = localtime(now()).date() + timedelta(days=1)
+    start_date_str = params.get('start_date') or tomorrow.isoformat()
+    end_date_str = params.get('end_date') or tomorrow.isoformat()
+
+    start_date = make_aware(datetime.strptime(start_date_str, "%Y-%m-%d"))
+    end_date = make_aware(datetime.strptime(end_date_str, "%Y-%m-%d")) + timedelta(days=1) - timedelta(seconds=1)
+    return start_date_str, end_date_str, start_date, end_date
+
+
+def filter_ahrefs_data(params):
+    """AhrefsData in the requested date range with the per-field >, =, < filters applied in SQL."""
+    _, _, start_date, end_date = parse_date_range(params)
+    queryset = AhrefsData.objects.filter(domain__expiration_date__range=[start_date, end_date])
+
+    for field in FIELD_NAMES:
+        raw_value = params.get(f"filter-{field}", "").strip()
+        operator = FILTER_OPERATORS.get(params.get(f"operator-{field}", "greater"))
+        if not raw_value or operator is None:
+            continue
+        try:
+            value = int(raw_value)
+        except ValueError:
+            continue
+        queryset = queryset.filter(**{f"{field}__{operator}": value})
+
+    return queryset
+
+
+def parse_sort(params):
+    sort = params.get("sort") if params.get("sort") in SORT_COLUMNS else DEFAULT_SORT
+    order = "desc" if params.get("order") == "desc" else "asc"
+    return sort, order
+
+
+def encode_cursor(sort, row):
+    value = row[SORT_COLUMNS[sort]]
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return f"{value}|{row['domain__domain_id']}"
+
+
+def decode_cursor(sort, cursor):
+    """Raises ValueError for a malformed cursor."""
+    value, domain_id = cursor.rsplit("|", 1)
+    value = datetime.fromisoformat(value) if sort == "expiration_date" else int(value)
+    return value, int(domain_id)
+
+
+def keyset_page(queryset, sort, order, after=None, page_size=PAGE_SIZE):
+    """
+    One page of rows ordered by (sort column, domain_id), starting after the `after` cursor.
+
+    Returns (rows, next_cursor), next_cursor is None on the last page.
+    """
+    column = SORT_COLUMNS[sort]
+    prefix, lookup = ("-", "lt") if order == "desc" else ("", "gt")
+    queryset = queryset.order_by(f"{prefix}{column}", f"{prefix}domain_id")
+
+    if after:
+        value, domain_id = decode_cursor(sort, after)
+        queryset = queryset.filter(
+            Q(**{f"{column}__{lookup}": value}) | Q(**{column: value, f"domain_id__{lookup}": domain_id})
+        )
+
+    rows = list(queryset.values(
+        'domain__domain_id',
+        'domain__name',
+        'domain__expiration_date',
+        *FIELD_NAMES
+    )[:page_size + 1])
+
+    next_cursor = encode_cursor(sort, rows[page_size - 1]) if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
+
+
+def format_row(entry):
+    return {
+        'domain_id': entry.get('domain__domain_id', 'N/A'),
+        'expiration_date': localtime(entry.get('domain__expiration_date')).strftime('%Y-%m-%d %H:%M')
+        if entry.get('domain__expiration_date') else 'N/A',
+        'domain': entry.get('domain__name', 'Unknown'),
+        'max_bet': 'N/A',
+        **{field: entry.get(field, 'N/A') for field in FIELD_NAMES}
+    }
@@ -0,0 +1,32 @@
+from decouple import Csv, config
+
+
+def optional_int(value):
+    return int(value) if str(value).strip() else None
+
+
+# cheap checks that drop obvious junk before any paid Ahrefs call, empty - no limit
+ALLOWED_TLDS = config("AHREFS_TLDS", default="", cast=Csv(post_process=tuple))  # e.g. com.ua,kiev.ua,ua
+MAX_NAME_LENGTH = config("AHREFS_MAX_NAME_LENGTH", default="", cast=optional_int)
+MAX_DIGITS = config("AHREFS_MAX_DIGITS", default="", cast=optional_int)
+MAX_HYPHENS = config("AHREFS_MAX_HYPHENS", default="", cast=optional_int)
+
+
+def prefilter_reason(name, tlds=ALLOWED_TLDS, max_length=MAX_NAME_LENGTH, max_digits=MAX_DIGITS,
+                     max_hyphens=MAX_HYPHENS):
+    """
+    Why the domain is not worth an Ahrefs lookup, None when it is.
+    Length, digits and hyphens are counted in the name without its zone: "my-shop.com.ua" -> "my-shop".
+    """
+    name = name.lower()
+    if tlds and not any(name.endswith(f".{tld.lower().lstrip('.')}") for tld in tlds):
+        return "tld"
+
+    label = name.split(".", 1)[0]
+    if max_length is not None and len(label) > max_length:
+        return "length"
+    if max_digits is not None and sum(char.isdigit() for char in label) > max_digits:
+        return "digits"
+    if max_hyphens is not None and label.removeprefix("xn--").count("-") > max_hyphens:  # punycode prefix is not a hyphen
+        return "hyphens"
+    return None
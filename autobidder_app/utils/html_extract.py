@@ -0,0 +1,145 @@
+import re
+
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree, html as lxml_html
+except ImportError:  # lxml is optional, BeautifulSoup is the fallback
+    lxml_html = None
+
+
+AUCTION_ENDED_TEXT = "Час прийому заявок минув"
+BID_RANGE_PATTERN = re.compile(r'від\s(\d+)\sдо\s(\d+)')
+
+
+def has_class(name):
+    """XPath predicate for an element having `name` among its classes."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def to_int(value):
+    """'1 200' / '1\xa0200' -> 1200, None if empty or not a number."""
+    if value is None:
+        return None
+    try:
+        return int(value.replace('\xa0', '').replace(' ', ''))
+    except ValueError:
+        return None
+
+
+def extract_bid_value(text):
+    """Minimum bid from the 'від X до Y' text."""
+    match = BID_RANGE_PATTERN.search(text or "")
+    return to_int(match.group(1)) if match else None
+
+
+def normalize_text(text):
+    return " ".join(text.split())
+
+
+class BeautifulSoupExtractor:
+    """Pure-python extractor, used when lxml is not installed."""
+
+    name = "beautifulsoup"
+
+    def parse_listing(self, html):
+        """Return (total_pages, [(domain_id, domain_name, raw_expiration_date), ...])."""
+        soup = BeautifulSoup(html, "html.parser")
+
+        total_pages = 1
+        pagination = soup.find("ul", class_="pagination")
+        if pagination:
+            page_numbers = [int(link.text) for link in pagination.find_all("a") if link.text.isdigit()]
+            total_pages = max(page_numbers, default=1)
+
+        rows = []
+        for row in soup.find_all("tr", style="cursor: pointer;"):
+            fqdn = row.find("div", class_="fqdn")
+            cells = row.find_all("td", class_="text-center")
+            rows.append((
+                row.get("data-id"),
+                fqdn.text.strip() if fqdn else None,
+                cells[1].text.strip() if len(cells) > 1 else None,
+            ))
+        return total_pages, rows
+
+    def parse_bid_page(self, html):
+        """Return (auction_ended, current_bid, next_bid)."""
+        soup = BeautifulSoup(html, "html.parser")
+
+        alert_message = soup.find("div", class_="alert alert-danger alert-dismissable")
+        if alert_message and AUCTION_ENDED_TEXT in normalize_text(alert_message.get_text()):
+            return True, None, None
+
+        bid_input = soup.find("input", {"id": "modal_backorder_sum"})
+        current_bid = to_int(bid_input.get("value")) if bid_input else None
+
+        bid_info = soup.find("p", {"id": "modal_backorder_original_info"})
+        next_bid = extract_bid_value(bid_info.text) if bid_info else None
+
+        return False, current_bid, next_bid
+
+
+class LxmlExtractor:
+    """libxml2-backed extractor with XPath expressions compiled once."""
+
+    name = "lxml"
+
+    def __init__(self):
+        self.pagination_links = etree.XPath(f"//ul[{has_class('pagination')}]//a/text()")
+        self.listing_rows = etree.XPath('//tr[@style="cursor: pointer;"]')
+        self.row_fqdn = etree.XPath(f".//div[{has_class('fqdn')}]")
+        self.row_cells = etree.XPath(f".//td[{has_class('text-center')}]")
+        self.ended_alert = etree.XPath(
+            f"//div[{has_class('alert')} and {has_class('alert-danger')} and {has_class('alert-dismissable')}]"
+        )
+        self.bid_input_value = etree.XPath('//input[@id="modal_backorder_sum"]/@value')
+        self.bid_info = etree.XPath('//p[@id="modal_backorder_original_info"]')
+
+    def parse_listing(self, html):
+        """Return (total_pages, [(domain_id, domain_name, raw_expiration_date), ...])."""
+        if not html.strip():
+            return 1, []
+        tree = lxml_html.fromstring(html)
+
+        page_numbers = [int(text) for text in self.pagination_links(tree) if text.strip().isdigit()]
+        total_pages = max(page_numbers, default=1)
+
+        rows = []
+        for row in self.listing_rows(tree):
+            fqdn = self.row_fqdn(row)
+            cells = self.row_cells(row)
+            rows.append((
+                row.get("data-id"),
+                fqdn[0].text_content().strip() if fqdn else None,
+                cells[1].text_content().strip() if len(cells) > 1 else None,
+            ))
+        return total_pages, rows
+
+    def parse_bid_page(self, html):
+        """Return (auction_ended, current_bid, next_bid)."""
+        if not html.strip():
+            return False, None, None
+        tree = lxml_html.fromstring(html)
+
+        if any(AUCTION_ENDED_TEXT in normalize_text(alert.text_content()) for alert in self.ended_alert(tree)):
+            return True, None, None
+
+        values = self.bid_input_value(tree)
+        current_bid = to_int(values[0]) if values else None
+
+        bid_info = self.bid_info(tree)
+        next_bid = extract_bid_value(bid_info[0].text_content()) if bid_info else None
+
+        return False, current_bid, next_bid
+
+
+extractor = LxmlExtractor() if lxml_html is not None else BeautifulSoupExtractor()
+
+
+def parse_listing(html):
+    return extractor.parse_listing(html)
+
+
+def parse_bid_page(html):
+    return extractor.parse_bid_page(html)
@@ -0,0 +1,192 @@
+import gzip
+import heapq
+import os
+import re
+from datetime import datetime
+from operator import itemgetter
+
+BLOCK_SIZE = 64 * 1024  # bytes read at once when walking a file backwards
+INDEX_STEP = 64 * 1024  # one (timestamp, offset) sample per this many bytes
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+# plain "2024-01-01 12:00:00 - INFO - ..." lines and JSON lines starting with {"time": "..."
+TIMESTAMP_PATTERN = re.compile(rb'^(?:\{"time": ")?(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})')
+
+
+def parse_timestamp(line):
+    """Timestamp at the start of a raw log line, None for continuation lines (tracebacks)."""
+    match = TIMESTAMP_PATTERN.match(line)
+    if match:
+        try:
+            return datetime.strptime(match.group(1).decode(), TIMESTAMP_FORMAT)
+        except ValueError:
+            return None
+    return None
+
+
+class LogFileIndex:
+    """
+    Sparse (timestamp, offset) samples of one append-only log file.
+
+    Only the bytes appended since the last refresh are read, so a request never
+    rescans the whole file. Lets a page start reading right before a timestamp.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.inode = None
+        self.size = 0
+        self.points = []  # (timestamp, offset of a line start), ascending
+
+    def refresh(self):
+        stat = os.stat(self.path)
+        if stat.st_ino != self.inode or stat.st_size < self.size:
+            # new or truncated file
+            self.inode, self.size, self.points = stat.st_ino, 0, []
+        if stat.st_size == self.size:
+            return
+
+        next_sample = self.points[-1][1] + INDEX_STEP if self.points else 0
+        offset = self.size
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if offset >= next_sample:
+                    timestamp = parse_timestamp(line)
+                    if timestamp is not None:
+                        self.points.append((timestamp, offset))
+                        next_sample = offset + INDEX_STEP
+                offset += len(line)
+        self.size = offset
+
+    def offset_after(self, timestamp):
+        """Offset of the first sampled line newer than `timestamp`, lines after it are all newer."""
+        position = next((offset for sample_time, offset in self.points if sample_time > timestamp), None)
+        return self.size if position is None else position
+
+
+_indexes = {}
+
+
+def get_index(path):
+    index = _indexes.get(path)
+    if index is None:
+        index = _indexes[path] = LogFileIndex(path)
+    index.refresh()
+    return index
+
+
+def read_lines_backwards(path, end_offset):
+    """Yield raw lines of `path` before `end_offset`, last line first."""
+    with open(path, "rb") as f:
+        position, remainder = end_offset, b""
+        while position > 0:
+            read_size = min(BLOCK_SIZE, position)
+            position -= read_size
+            f.seek(position)
+            lines = (f.read(read_size) + remainder).split(b"\n")
+            remainder = lines.pop(0)
+            yield from reversed(lines)
+        if remainder:
+            yield remainder
+
+
+_compressed_ranges = {}  # path -> (mtime, first timestamp, last timestamp) of a .gz day
+
+
+def compressed_range(path):
+    """
+    (first, last) timestamp of a compressed day (see LOG_COMPRESS), read once per file:
+    .gz files are written once, a new mtime means a new file.
+    """
+    mtime = os.path.getmtime(path)
+    cached = _compressed_ranges.get(path)
+    if cached is None or cached[0] != mtime:
+        first = last = None
+        with gzip.open(path, "rb") as f:
+            for line in f:
+                timestamp = parse_timestamp(line)
+                if timestamp is not None:
+                    first = first or timestamp
+                    last = timestamp
+        cached = _compressed_ranges[path] = (mtime, first, last)
+    return cached[1], cached[2]
+
+
+def read_compressed_entries_backwards(path, newest, label):
+    """
+    Starts with a (newest, None) placeholder, so the file is decompressed only once the page
+    gets down to `newest`. gzip can't seek backwards, the day is then read at once.
+    """
+    yield newest, None
+    with gzip.open(path, "rb") as f:
+        lines = f.read().split(b"\n")
+    yield from read_entries_backwards(reversed(lines), label)
+
+
+def read_entries_backwards(lines, label):
+    """Yield (timestamp, text) newest first, lines without a timestamp are attached to their entry."""
+    continuation = []
+    for line in lines:
+        if not line.strip():
+            continue
+        timestamp = parse_timestamp(line)
+        if timestamp is None:
+            continuation.append(line)
+            continue
+        text = b"\n".join([line, *reversed(continuation)]).decode("utf-8", "replace")
+        continuation = []
+        yield timestamp, f"{label}: {text}"
+
+
+def read_log_page(directories, query="", before=None, skip=0, page_size=100):
+    """
+    Newest log entries across all files of `directories`, reading files backwards and
+    stopping as soon as one page is found.
+
+    `before`/`skip` is the cursor returned for the previous page: entries newer than `before`
+    and the first `skip` matching entries at exactly `before` are already shown.
+    Returns (entries, next_cursor), next_cursor is None on the last page.
+    """
+    streams = []
+    for directory in directories:
+        if not os.path.isdir(directory):
+            continue
+        for file_name in os.listdir(directory):
+            path = os.path.join(directory, file_name)
+            if not os.path.isfile(path) or file_name.endswith(".tmp"):
+                continue  # a file being compressed
+            if file_name.endswith(".gz"):
+                first, last = compressed_range(path)
+                if last is None or (before and first > before):
+                    continue  # nothing at or before the cursor
+                newest = min(last, before) if before else last
+                streams.append(read_compressed_entries_backwards(path, newest, file_name))
+            else:
+                index = get_index(path)
+                end_offset = index.offset_after(before) if before else index.size
+                streams.append(read_entries_backwards(read_lines_backwards(path, end_offset), file_name))
+
+    entries, skipped = [], 0
+    for timestamp, text in heapq.merge(*streams, key=itemgetter(0), reverse=True):
+        if text is None:
+            continue  # placeholder of a compressed file
+        if before and timestamp > before:
+            continue
+        if query and query not in text.lower():
+            continue
+        if before and timestamp == before and skipped < skip:
+            skipped += 1
+            continue
+        entries.append((timestamp, text))
+        if len(entries) > page_size:
+            break
+
+    if len(entries) <= page_size:
+        return entries, None
+
+    entries = entries[:page_size]
+    last_timestamp = entries[-1][0]
+    shown_at_last = sum(1 for timestamp, _ in entries if timestamp == last_timestamp)
+    if last_timestamp == before:
+        shown_at_last += skip
+    return entries, (last_timestamp, shown_at_last)
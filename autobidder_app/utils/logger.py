@@ -1,32 +1,117 @@
 import os
+import gzip
+import json
 import time
+import atexit
+import shutil
 import logging
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+
+from decouple import config
 from django.utils.timezone import now, localtime
 
-def setup_logger(name, log_directory="logs/default", days=7):
+# JSON lines through a background listener thread instead of inline file writes
+LOG_JSON = config("LOG_JSON", default=False, cast=bool)
+# gzip the files of finished days
+LOG_COMPRESS = config("LOG_COMPRESS", default=False, cast=bool)
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+# keys of `extra={...}` copied into JSON lines
+STRUCTURED_FIELDS = ("domain_id", "domain", "action", "bid", "next_bid", "max_bet", "latency_ms", "status")
 
-    os.makedirs(log_directory, exist_ok=True)
+_listeners = []
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per line, "time" first so the logs page can still read the timestamp."""
 
-    # Clean old logs
-    clean_old_logs(log_directory, days=days)
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, TIMESTAMP_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
 
-    # Create log file name based on the current date
-    log_filename = os.path.join(log_directory, f"{name}_{localtime(now()).strftime('%Y-%m-%d')}.log")
+
+def setup_logger(name, log_directory="logs/default", days=7, structured=None):
+    """
+    Log into `<log_directory>/<name>_<date>.log`, a new file every day, kept for `days` days.
+    `structured` defaults to the LOG_JSON setting.
+    """
+
+    os.makedirs(log_directory, exist_ok=True)
 
     logger = logging.getLogger(name)
     logger.setLevel(logging.INFO)
 
     # Prevent adding duplicate handlers
     if not logger.handlers:
-        handler = logging.FileHandler(log_filename)
-        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
+        handler = DailyFileHandler(log_directory, name, days)
+        if LOG_JSON if structured is None else structured:
+            handler.setFormatter(JsonLinesFormatter())
+            logger.addHandler(queue_handler(handler))
+        else:
+            formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', datefmt=TIMESTAMP_FORMAT)
+            handler.setFormatter(formatter)
+            logger.addHandler(handler)
 
     return logger
 
 
+def current_date():
+    return localtime(now()).strftime('%Y-%m-%d')
+
+
+class DailyFileHandler(logging.FileHandler):
+    """
+    Appends to `<name>_<date>.log` and switches to the next date's file after midnight.
+
+    Files are never renamed, so every process (cron commands, the scheduler, the site)
+    can log into the same directory: each one only appends to the file of the current day.
+    Old files are cleaned at the switch, nothing is scanned when a logger is set up.
+    """
+
+    def __init__(self, log_directory, name, days):
+        self.log_directory = log_directory
+        self.name_prefix = name
+        self.days = days
+        self.date = current_date()
+        super().__init__(self.path_for(self.date), encoding="utf-8", delay=True)
+
+    def path_for(self, date):
+        return os.path.join(self.log_directory, f"{self.name_prefix}_{date}.log")
+
+    def emit(self, record):
+        if current_date() != self.date:
+            self.switch_date()
+        super().emit(record)
+
+    def switch_date(self):
+        self.acquire()
+        try:
+            date = current_date()
+            if date == self.date:
+                return  # switched by another thread
+            self.date = date
+            self.baseFilename = os.path.abspath(self.path_for(date))
+            if self.stream:
+                self.stream.close()
+                self.stream = None  # reopened on the next write
+        finally:
+            self.release()
+        clean_old_logs(self.log_directory, days=self.days)
+
+
 def clean_old_logs(log_dir, days=7):
+    """Remove files not written for `days` days and, with LOG_COMPRESS, gzip the ones idle for a day."""
 
     time_now = time.time()
 
@@ -35,7 +120,48 @@ def clean_old_logs(log_dir, days=7):
 
     for filename in os.listdir(log_dir):
         file_path = os.path.join(log_dir, filename)
-        if os.path.isfile(file_path):
-            file_age = time_now - os.path.getmtime(file_path)
-            if file_age > days * 86400:  # 86400 seconds = 1 day
-                os.remove(file_path)
\ No newline at end of file
+        if not os.path.isfile(file_path):
+            continue
+        file_age = time_now - os.path.getmtime(file_path)
+        if file_age > days * 86400:  # 86400 seconds = 1 day
+            remove_quietly(file_path)
+        elif LOG_COMPRESS and filename.endswith(".log") and file_age > 86400:
+            # no process writes into a file of a finished day any more
+            compress_log(file_path)
+
+
+def compress_log(path):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(path, "rb") as f_in, gzip.open(tmp_path, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.replace(tmp_path, f"{path}.gz")
+    except OSError:
+        remove_quietly(tmp_path)
+        return
+    remove_quietly(path)
+
+
+def remove_quietly(path):
+    """Another process cleaning the same directory may have removed it already."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def queue_handler(handler):
+    """Wrap `handler` so records are only enqueued by the caller and written by a listener thread."""
+    queue = SimpleQueue()
+    listener = QueueListener(queue, handler, respect_handler_level=True)
+    listener.start()
+    if not _listeners:
+        atexit.register(stop_listeners)
+    _listeners.append(listener)
+    return QueueHandler(queue)
+
+
+def stop_listeners():
+    """Flush queued records on exit."""
+    while _listeners:
+        _listeners.pop().stop()
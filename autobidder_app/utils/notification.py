@@ -1,7 +1,15 @@
+import asyncio
 import logging
+from datetime import timedelta
 from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from asgiref.sync import sync_to_async
 from decouple import config
+from django.utils.timezone import now
+
+from autobidder_app.models import Bet, OutbidAlert
+from autobidder_app.utils.rate_limit import TokenBucket
 
 # Configure logging
 logger = logging.getLogger("telegram_bot")
@@ -10,23 +18,216 @@ logger = logging.getLogger("telegram_bot")
 TOKEN = config("TELEGRAM_TOKEN")
 GROUP_CHAT_ID = int(config("GROUP_CHAT_ID"))
 
-# Initialize Telegram Bot
-bot = Bot(TOKEN)
+# Telegram allows about 20 messages per minute into one group
+MESSAGES_PER_SECOND = config("TELEGRAM_MESSAGES_PER_SECOND", default=0.33, cast=float)
+MESSAGE_BURST = config("TELEGRAM_MESSAGE_BURST", default=3, cast=int)
+SEND_CONCURRENCY = config("TELEGRAM_SEND_CONCURRENCY", default=4, cast=int)
+SEND_RETRIES = 3
+# seconds to wait for more alerts of the same cycle before sending
+BATCH_WINDOW = config("TELEGRAM_BATCH_WINDOW", default=1.0, cast=float)
+# this many alerts in one batch are merged into a digest, 0 - never
+DIGEST_THRESHOLD = config("TELEGRAM_DIGEST_THRESHOLD", default=0, cast=int)
+DIGEST_SIZE = 20  # domains per digest message, 3 buttons each keeps the keyboard within Telegram limits
+DIGEST_TITLE = "⚠️ Current bets exceed our max bets:"
+# the same competing bid is reported again only after this long
+ALERT_COOLDOWN = timedelta(minutes=config("TELEGRAM_ALERT_COOLDOWN", default=60, cast=int))
+
+
+def bet_exceeded_text(domain_name, current_bet, max_bet):
+    return (
+        f"⚠️ Current bet ({current_bet} UAH) exceeds our max bet ({max_bet} UAH).\n"
+        f"Domain: {domain_name}\nWhat would you like to do?"
+    )
+
 
-async def send_bet_exceeded_message(domain_name, current_bet, max_bet, domain_id):
-    """Send a Telegram notification when a bet exceeds the maximum allowed."""
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+def bet_exceeded_keyboard(domain_id, current_bet):
+    return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="Cancel Bet", callback_data=f"cancel_{domain_id}")],
         [InlineKeyboardButton(text="+ 100 UAH", callback_data=f"increase_100_{domain_id}_{current_bet}")],
         [InlineKeyboardButton(text="+ 1000 UAH", callback_data=f"increase_1000_{domain_id}_{current_bet}")]
     ])
 
-    async with bot:
+
+def digest_message(alerts):
+    """One message and keyboard for several (domain_name, current_bet, max_bet, domain_id) alerts."""
+    lines = [DIGEST_TITLE]
+    keyboard = []
+    for domain_name, current_bet, max_bet, domain_id in alerts:
+        lines.append(f"• {domain_name} (ID {domain_id}): {current_bet} UAH > {max_bet} UAH")
+        keyboard.append([
+            InlineKeyboardButton(text=f"❌ {domain_name}", callback_data=f"cancel_{domain_id}"),
+            InlineKeyboardButton(text="+100", callback_data=f"increase_100_{domain_id}_{current_bet}"),
+            InlineKeyboardButton(text="+1000", callback_data=f"increase_1000_{domain_id}_{current_bet}"),
+        ])
+    return "\n".join(lines), InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+def due_alerts(alerts):
+    """
+    (domain_name, current_bet, max_bet, domain_id) alerts worth sending: first alert for the bet,
+    a different competing bid, or ALERT_COOLDOWN passed since the last message.
+    Alerts for bets deleted in the meantime are dropped.
+    """
+    alerts = list({alert[3]: alert for alert in alerts}.values())  # last alert per domain
+    domain_ids = [alert[3] for alert in alerts]
+    existing = set(Bet.objects.filter(domain_id__in=domain_ids).values_list("domain_id", flat=True))
+    states = OutbidAlert.objects.in_bulk(domain_ids)
+    cutoff = now() - ALERT_COOLDOWN
+
+    due = []
+    for alert in alerts:
+        if alert[3] not in existing:
+            continue
+        state = states.get(alert[3])
+        if state is None or state.current_bet != alert[1] or state.sent_at <= cutoff:
+            due.append(alert)
+    return due
+
+
+def record_alerts(alerts):
+    """Remember sent alerts, bets deleted in the meantime are skipped."""
+    alerts = {alert[3]: alert for alert in alerts}
+    existing = set(Bet.objects.filter(domain_id__in=alerts).values_list("domain_id", flat=True))
+    states = OutbidAlert.objects.in_bulk(list(existing))
+    sent_at = now()
+
+    OutbidAlert.objects.bulk_create(
+        [
+            OutbidAlert(
+                bet_id=domain_id,
+                current_bet=alerts[domain_id][1],
+                sent_at=sent_at,
+                times_sent=states[domain_id].times_sent + 1 if domain_id in states else 1,
+            )
+            for domain_id in existing
+        ],
+        update_conflicts=True,
+        unique_fields=["bet"],
+        update_fields=["current_bet", "sent_at", "times_sent"],
+    )
+
+
+async def send_bet_exceeded_message(domain_name, current_bet, max_bet, domain_id, force=False):
+    """Send a Telegram notification when a bet exceeds the maximum allowed, unless it was already reported."""
+    alert = (domain_name, current_bet, max_bet, domain_id)
+    if not force and not await sync_to_async(due_alerts)([alert]):
+        logger.info(f"Notification for {domain_name} (ID: {domain_id}) at {current_bet} UAH already sent, skipping")
+        return False
+
+    async with Bot(TOKEN) as bot:  # own session, callers may run in different event loops
         await bot.send_message(
             GROUP_CHAT_ID,
-            f"⚠️ Current bet ({current_bet} UAH) exceeds our max bet ({max_bet} UAH).\n"
-            f"Domain: {domain_name}\nWhat would you like to do?",
-            reply_markup=keyboard
+            bet_exceeded_text(domain_name, current_bet, max_bet),
+            reply_markup=bet_exceeded_keyboard(domain_id, current_bet)
         )
 
-    logger.info(f"Notification sent for {domain_name} (ID: {domain_id})")
\ No newline at end of file
+    await sync_to_async(record_alerts)([alert])
+    logger.info(f"Notification sent for {domain_name} (ID: {domain_id})")
+    return True
+
+
+class NotificationDispatcher:
+    """
+    Background queue of outbid alerts, sent over one bot session within Telegram rate limits.
+
+        async with NotificationDispatcher() as notifications:
+            notifications.enqueue(domain_name, current_bet, max_bet, domain_id)
+
+    Each dispatcher opens its own bot session: workers run their own event loops,
+    and an aiohttp session must not outlive or cross its loop.
+    Leaving the block sends everything still queued and closes that session.
+    """
+
+    def __init__(self, digest_threshold=DIGEST_THRESHOLD, batch_window=BATCH_WINDOW):
+        self.digest_threshold = digest_threshold
+        self.batch_window = batch_window
+        self.queue = asyncio.Queue()
+        self.semaphore = asyncio.Semaphore(SEND_CONCURRENCY)
+        self.rate_limiter = TokenBucket(MESSAGES_PER_SECOND, MESSAGE_BURST)
+        self.bot = None
+        self.worker = None
+
+    async def __aenter__(self):
+        self.bot = Bot(TOKEN)
+        self.worker = asyncio.create_task(self.run())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.queue.put_nowait(None)  # stop marker, after everything already queued
+        try:
+            await self.worker
+        finally:
+            await self.bot.session.close()
+
+    def enqueue(self, domain_name, current_bet, max_bet, domain_id):
+        """Never blocks the caller."""
+        self.queue.put_nowait((domain_name, current_bet, max_bet, domain_id))
+
+    async def run(self):
+        stopping = False
+        while not stopping:
+            alert = await self.queue.get()
+            if alert is None:
+                return
+            await asyncio.sleep(self.batch_window)
+
+            alerts = [alert]
+            while not self.queue.empty():
+                alert = self.queue.get_nowait()
+                if alert is None:
+                    stopping = True
+                else:
+                    alerts.append(alert)
+            try:
+                await self.send_batch(alerts)
+            except Exception as e:
+                logger.error(f"Failed to send {len(alerts)} notification(s): {e}", exc_info=True)
+
+    async def send_batch(self, alerts):
+        due = await sync_to_async(due_alerts)(alerts)
+        if len(due) < len(alerts):
+            logger.info(f"Skipping {len(alerts) - len(due)} alert(s) already sent for the same bid")
+        if not due:
+            return
+
+        if self.digest_threshold and len(due) >= self.digest_threshold:
+            chunks = [due[i:i + DIGEST_SIZE] for i in range(0, len(due), DIGEST_SIZE)]
+            messages = [(*digest_message(chunk), chunk) for chunk in chunks]
+            logger.info(f"Sending {len(due)} outbid alerts as {len(messages)} digest message(s)")
+        else:
+            messages = [
+                (bet_exceeded_text(domain_name, current_bet, max_bet), bet_exceeded_keyboard(domain_id, current_bet),
+                 [(domain_name, current_bet, max_bet, domain_id)])
+                for domain_name, current_bet, max_bet, domain_id in due
+            ]
+        results = await asyncio.gather(*(self.send(text, keyboard) for text, keyboard, _ in messages))
+
+        sent = [alert for (_, _, chunk), ok in zip(messages, results) if ok for alert in chunk]
+        if sent:
+            await sync_to_async(record_alerts)(sent)
+        for domain_name, _, _, domain_id in sent:
+            logger.info(f"Notification sent for {domain_name} (ID: {domain_id})")
+
+    async def send(self, text, keyboard):
+        """Returns True once Telegram accepted the message."""
+        async with self.semaphore:
+            for attempt in range(1, SEND_RETRIES + 1):
+                await self.rate_limiter.acquire()
+                try:
+                    await self.bot.send_message(GROUP_CHAT_ID, text, reply_markup=keyboard)
+                    return True
+                except TelegramRetryAfter as e:
+                    logger.warning(f"Telegram flood control, retry {attempt} in {e.retry_after}s")
+                    await asyncio.sleep(e.retry_after)
+                except Exception as e:
+                    logger.error(f"Failed to send notification: {e}")
+                    return False
+            logger.error(f"Notification dropped after {SEND_RETRIES} attempts: {text.splitlines()[0]}")
+            return False
+
+
+async def send_alerts(alerts):
+    """Send (domain_name, current_bet, max_bet, domain_id) alerts through one dispatcher."""
+    async with NotificationDispatcher() as notifications:
+        for alert in alerts:
+            notifications.enqueue(*alert)
@@ -0,0 +1,84 @@
+import asyncio
+import fcntl
+import time
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens=1):
+        """Wait until `tokens` are available and take them. rate <= 0 means no limit."""
+        if self.rate <= 0:
+            return
+
+        async with self._lock:
+            while True:
+                current = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (current - self.updated_at) * self.rate)
+                self.updated_at = current
+
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+class HostRateLimiter:
+    """One token bucket per host, so a slow host does not throttle the others."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity
+        self.buckets = {}
+
+    async def acquire(self, url):
+        host = urlsplit(url).netloc
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            bucket = self.buckets[host] = TokenBucket(self.rate, self.capacity)
+        await bucket.acquire()
+
+
+class SharedRateLimiter:
+    """
+    `rate` requests per second shared by every process and thread that uses the same `path`.
+
+    Each acquire reserves the next free slot, kept in the file under an exclusive flock,
+    then sleeps until that slot. rate <= 0 means no limit.
+    """
+
+    def __init__(self, path, rate):
+        self.path = path
+        self.rate = rate
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        delay = await asyncio.to_thread(self.reserve)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def reserve(self):
+        """Take the next slot, returns seconds until it."""
+        with open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)  # released when the file is closed
+            f.seek(0)
+            try:
+                next_free = float(f.read().strip() or 0)
+            except ValueError:
+                next_free = 0.0
+            current = time.time()
+            slot = max(current, next_free)
+            f.seek(0)
+            f.truncate()
+            f.write(repr(slot + 1 / self.rate))
+        return slot - current
@@ -1,27 +1,56 @@
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
 import requests
 from decouple import config
 from autobidder_app.utils.logger import setup_logger
 
 
-LOGIN_URL = "https://voodoo.domains/uk/accounts/ajax/auth"
+VOODOO_SITE_URL = "https://voodoo.domains"
+# point to a local stand-in (see benchmarks/voodoo_standin.py) for offline runs
+VOODOO_BASE_URL = config("VOODOO_BASE_URL", default=VOODOO_SITE_URL).rstrip("/")
+LOGIN_URL = f"{VOODOO_BASE_URL}/uk/accounts/ajax/auth"
+AUTH_CACHE_TTL = config("VOODOO_AUTH_TTL", default=900, cast=int)  # seconds we trust a verified session
+# a stand-in gets its own file, so its cookies never replace the real session
+SESSION_FILE = config(
+    "VOODOO_SESSION_FILE",
+    default=".voodoo_session.json" if VOODOO_BASE_URL == VOODOO_SITE_URL
+    else f".voodoo_session.{urlparse(VOODOO_BASE_URL).netloc.replace(':', '_')}.json"
+)
+LOGGED_OUT_MARKER = 'name="auth_login"'  # login form is rendered only for anonymous users
 logger = setup_logger("authenticator", log_directory="logs/auth", days=7)
 
+class LoggedOutError(Exception):
+    """Voodoo still answers with the login form after logging in again."""
+
+
 class Authenticator:
     def __init__(self):
         self.session = requests.Session()
         self.is_authenticated = False
+        self.verified_at = 0
+        self.login_count = 0
+        self.relogin_lock = threading.Lock()
+        self.load_session()
 
     def is_logged_in(self):
+        if self.is_authenticated and time.time() - self.verified_at < AUTH_CACHE_TTL:
+            return True
+
         logger.info("Checking user authentication status...")
         try:
-            response = self.session.get(LOGIN_URL)
+            response = self.session.get(LOGIN_URL, timeout=10)
             response_json = response.json()
 
             if response_json.get("auth_id") == 0:
                 logger.warning("User not logged in. Attempting login...")
+                self.invalidate()
                 return self.login()
             else:
-                self.is_authenticated = True
+                self.mark_authenticated()
                 logger.info("User is already logged in.")
                 return True
         except (requests.RequestException, ValueError) as e:
@@ -40,14 +69,87 @@ class Authenticator:
         }
 
         try:
-            response = self.session.post(LOGIN_URL, data=payload)
+            response = self.session.post(LOGIN_URL, data=payload, timeout=10)
             response.raise_for_status()
 
             response_json = response.json()
             if response_json.get("auth_id", 0) > 0:
-                self.is_authenticated = True
+                self.login_count += 1
+                self.mark_authenticated()
                 logger.info(f"Login successful with auth_id: {response_json['auth_id']}")
                 return True
         except (requests.RequestException, ValueError) as e:
             logger.error(f"Login failed: {e}")
-        return False
\ No newline at end of file
+        return False
+
+    def relogin(self):
+        """Drop the cached state and log in again."""
+        logger.warning("Session expired on Voodoo side. Logging in again...")
+        self.invalidate()
+        return self.login()
+
+    def is_logged_out_response(self, response_text):
+        """Voodoo answers with the login form instead of the page when the session is gone."""
+        return LOGGED_OUT_MARKER in response_text
+
+    def request(self, method, url, **kwargs):
+        """
+        Send a request with the shared session, re-login once if the response shows we were logged out.
+        Raises LoggedOutError if it still does.
+        """
+        login_count = self.login_count
+        response = self.session.request(method, url, **kwargs)
+        if self.is_logged_out_response(response.text):
+            if self.relogin_once(login_count):
+                response = self.session.request(method, url, **kwargs)
+            if self.is_logged_out_response(response.text):
+                raise LoggedOutError(f"Logged out of Voodoo, re-login failed ({method.upper()} {url})")
+        return response
+
+    def relogin_once(self, seen_login_count):
+        """Thread-safe relogin: skipped if another thread already logged in after `seen_login_count`."""
+        with self.relogin_lock:
+            if self.login_count == seen_login_count:
+                return self.relogin()
+            return self.is_authenticated
+
+    def mark_authenticated(self):
+        self.is_authenticated = True
+        self.verified_at = time.time()
+        self.save_session()
+
+    def invalidate(self):
+        self.is_authenticated = False
+        self.verified_at = 0
+
+    def load_session(self):
+        """Restore cookies saved by a previous run, so make_bets/voodoo_parse share one login."""
+        if not os.path.exists(SESSION_FILE):
+            return
+
+        try:
+            with open(SESSION_FILE) as f:
+                data = json.load(f)
+            for cookie in data.get("cookies", []):
+                self.session.cookies.set(**cookie)
+            self.verified_at = data.get("verified_at", 0)
+            self.is_authenticated = time.time() - self.verified_at < AUTH_CACHE_TTL
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Could not load saved session: {e}")
+
+    def save_session(self):
+        data = {
+            "verified_at": self.verified_at,
+            "cookies": [
+                {"name": c.name, "value": c.value, "domain": c.domain, "path": c.path, "expires": c.expires}
+                for c in self.session.cookies
+            ],
+        }
+
+        try:
+            tmp_file = f"{SESSION_FILE}.tmp"
+            with open(os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_file, SESSION_FILE)
+        except OSError as e:
+            logger.warning(f"Could not save session: {e}")
@@ -2,27 +2,32 @@ import logging
 import os
 
 
+from django.core.exceptions import ValidationError
 from django.shortcuts import render, get_object_or_404, redirect, HttpResponse
-from django.utils.timezone import localtime, make_aware, now
+from django.utils.timezone import make_aware
 from django.views.decorators.csrf import csrf_exempt
-from django.core.paginator import Paginator
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
 from django.conf import settings
-from django.db.models import F
 from django import forms
 
-from autobidder_app.management.commands.ahrefs_data import AhrefsFetcher
+from autobidder_app.management.commands.ahrefs_data import UNITS_PER_DOMAIN
 from autobidder_app.management.commands.voodoo_parse import run_parser
-from autobidder_app.models import AhrefsData, Domain, Bet
-from .utils.ahrefs_balance import check_api_limit
+from autobidder_app.models import AhrefsLookup, Domain, Bet, OutbidAlert
+from .utils.ahrefs_balance import check_api_limit, rows_left
+from .utils.ahrefs_export import COLUMNAR_FORMATS, EXPORT_FORMATS, export_rows, pyarrow, stream_export
+from .utils.ahrefs_lookup import fail_stale_lookups, lookup_fields, lookup_rows, start_lookup
+from .utils.log_reader import TIMESTAMP_FORMAT, read_log_page
+from .utils.ahrefs_query import (
+    AHREFS_FIELDS, FIELD_NAMES, filter_ahrefs_data, format_row, keyset_page, parse_date_range, parse_sort
+)
 
-import asyncio
 import csv
 
 
-from datetime import datetime, timedelta
+from datetime import datetime
 from .forms import BetForm, ClaimBetForm
-import re
 
 def run_voodoo_parser(request):
     result = run_parser()
@@ -30,74 +35,68 @@ def run_voodoo_parser(request):
 
 
 def ahrefs_data_view(request):
-    fields = [
-        ('domain_rating', 'DR'),
-        ('ref_domains', 'Ref Dom'),
-        ('backlinks', 'BL'),
-        ('dofollow_links', 'DF Links'),
-        ('ahrefs_top', 'Top'),
-        ('alternate_links', 'Alt Links'),
-        ('canonical_links', 'CL'),
-        ('gov_links', 'Gov Links'),
-        ('edu_links', 'Edu Links'),
-        ('external_links', 'Ext Links'),
-        ('redirect_links', 'Redirects'),
-        ('sponsored_links', 'Spon Links'),
-        ('html_pages', 'HTML Pgs'),
-        ('image_links', 'Img Links'),
-        ('internal_links', 'Int Links'),
-        ('linked_root_domains', 'LRD'),
-        ('nofollow_links', 'NF Links'),
-        ('pages', 'Pgs'),
-        ('ref_class_c', 'Ref C-Class'),
-        ('ref_ips', 'Ref IPs'),
-        ('ref_pages', 'Ref Pgs'),
-        ('rss_links', 'RSS Links'),
-        ('text_links', 'Txt Links'),
-        ('ugc_links', 'UGC Links'),
-        ('valid_pages', 'Valid Pgs'),
-    ]
-
-    tomorrow = localtime(now()).date() + timedelta(days=1)
-    start_date_str = request.GET.get('start_date', tomorrow.isoformat())
-    end_date_str = request.GET.get('end_date', tomorrow.isoformat())
-
-    start_date = make_aware(datetime.strptime(start_date_str, "%Y-%m-%d"))
-    end_date = make_aware(datetime.strptime(end_date_str, "%Y-%m-%d")) + timedelta(days=1) - timedelta(seconds=1)
-
-    ahrefs_data = AhrefsData.objects.select_related('domain').filter(
-        domain__expiration_date__range=[start_date, end_date]
-    ).values(
-        'domain__domain_id',
-        'domain__name',
-        'domain__expiration_date',
-        *[field[0] for field in fields]
-    )
+    start_date_str, end_date_str, _, _ = parse_date_range(request.GET)
+    sort, order = parse_sort(request.GET)
 
-    formatted_data = [
-        {
-            'domain_id': entry.get('domain__domain_id', 'N/A'),
-            'expiration_date': localtime(entry.get('domain__expiration_date')).strftime('%Y-%m-%d %H:%M')
-            if entry.get('domain__expiration_date') else 'N/A',
-            'domain': entry.get('domain__name', 'Unknown'),
-            'max_bet': 'N/A',
-            **{field[0]: entry.get(field[0], 'N/A') for field in fields}
-        }
-        for entry in ahrefs_data
-    ]
+    rows, next_cursor = keyset_page(filter_ahrefs_data(request.GET), sort, order)
 
     form = ClaimBetForm()
 
     context = {
-        'fields': fields,
-        'ahrefs_data': formatted_data,
+        'fields': AHREFS_FIELDS,
+        'ahrefs_data': [format_row(entry) for entry in rows],
+        'next_cursor': next_cursor,
+        'sort': sort,
+        'order': order,
+        'filters': {field: request.GET.get(f"filter-{field}", "") for field in FIELD_NAMES},
+        'operators': {field: request.GET.get(f"operator-{field}", "greater") for field in FIELD_NAMES},
         'start_date': start_date_str,
         'end_date': end_date_str,
         'form': form,
+        'columnar_export': pyarrow is not None,
     }
     return render(request, 'ahrefs_data.html', context)
 
 
+def ahrefs_data_api(request):
+    """One page of the Ahrefs table as JSON, same parameters as ahrefs_data_view plus `after` cursor."""
+    sort, order = parse_sort(request.GET)
+    try:
+        rows, next_cursor = keyset_page(
+            filter_ahrefs_data(request.GET), sort, order, after=request.GET.get('after')
+        )
+    except ValueError as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+
+    formatted_data = [format_row(entry) for entry in rows]
+    html = render_to_string(
+        'partials/ahrefs_rows.html', {'ahrefs_data': formatted_data, 'fields': AHREFS_FIELDS}, request=request
+    )
+    return JsonResponse({"rows": formatted_data, "html": html, "next": next_cursor})
+
+
+def export_ahrefs_data(request, file_type):
+    """The Ahrefs table with the same filters and sort as a streamed CSV, Parquet or Arrow IPC file."""
+    if file_type not in EXPORT_FORMATS:
+        return HttpResponse("Invalid file type.", content_type="text/plain", status=400)
+    if file_type in COLUMNAR_FORMATS and pyarrow is None:
+        return HttpResponse("Parquet and Arrow exports need pyarrow installed.", content_type="text/plain", status=501)
+
+    try:
+        start_date_str, end_date_str, _, _ = parse_date_range(request.GET)
+        queryset = filter_ahrefs_data(request.GET)
+    except ValueError as e:
+        return HttpResponse(f"Invalid date: {e}", content_type="text/plain", status=400)
+    sort, order = parse_sort(request.GET)
+
+    content_type, extension = EXPORT_FORMATS[file_type]
+    response = StreamingHttpResponse(
+        stream_export(export_rows(queryset, sort, order), file_type), content_type=content_type
+    )
+    response["Content-Disposition"] = f'attachment; filename="ahrefs_data_{start_date_str}_{end_date_str}.{extension}"'
+    return response
+
+
 logger = logging.getLogger(__name__)
 
 
@@ -143,6 +142,8 @@ def update_max_bet(request, bet_id):
         form = BetForm(request.POST, instance=bet)
         if form.is_valid():
             form.save()
+            if 'max_bet' in form.changed_data:
+                OutbidAlert.objects.filter(bet=bet).delete()  # alert again under the new limit
             return redirect('all_bets')
     return redirect('all_bets')
 
@@ -152,46 +153,36 @@ def delete_bet(request, bet_id):
     bet.delete()
     return redirect('all_bets')
 
-LOGS_DIR = os.path.join(settings.BASE_DIR, 'logs/make_bets')
-
-
-def parse_log_entry(file_name, line):   #
-    timestamp_pattern = r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}'
-    match = re.search(timestamp_pattern, line)
-    if match:
-        timestamp = datetime.strptime(match.group(0), '%Y-%m-%d %H:%M:%S')
-    else:
-        timestamp = datetime.now() #to see when the error occured for debugging
-
-    return timestamp, f"{file_name}: {line.strip()}"
+LOG_SOURCES = ['make_bets', 'auth', 'voodoo', 'ahrefs', 'telegram']
+LOGS_DIR = os.path.join(settings.BASE_DIR, 'logs')
 
 
 def log_list_view(request):
-    """Shows the logs on page"""
-    log_entries = []
+    """Shows the logs on page, newest first, one page of matches per request"""
     query = request.GET.get('q', '').strip().lower()
-
-    if os.path.exists(LOGS_DIR):
-        # Get files sorted newest first
-        log_files = sorted(os.listdir(LOGS_DIR), reverse=True)
-
-        for log_file in log_files:
-            file_path = os.path.join(LOGS_DIR, log_file)
-            with open(file_path, 'r') as f:
-                lines = f.readlines()
-                for line in reversed(lines):
-                    if query in line.lower():
-                        log_entries.append(parse_log_entry(log_file, line))
-
-    log_entries.sort(key=lambda x: x[0], reverse=True)
-
-    paginator = Paginator([entry[1] for entry in log_entries], 100)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    source = request.GET.get('source', '')
+    sources = [source] if source in LOG_SOURCES else LOG_SOURCES
+
+    before = None
+    try:
+        if request.GET.get('before'):
+            before = datetime.strptime(request.GET['before'], TIMESTAMP_FORMAT)
+        skip = int(request.GET.get('skip', 0))
+    except ValueError:
+        before, skip = None, 0
+
+    entries, next_cursor = read_log_page(
+        [os.path.join(LOGS_DIR, name) for name in sources], query=query, before=before, skip=skip
+    )
 
     return render(request, 'logs_list.html', {
-        'page_obj': page_obj,
-        'query': query
+        'logs': [text for _, text in entries],
+        'next_before': next_cursor[0].strftime(TIMESTAMP_FORMAT) if next_cursor else None,
+        'next_skip': next_cursor[1] if next_cursor else None,
+        'is_first_page': before is None,
+        'query': query,
+        'source': source,
+        'sources': LOG_SOURCES,
     })
 
 
@@ -206,53 +197,66 @@ class AhrefsForm(forms.Form):
     )
 
 
-async def fetch_ahrefs_bulk(domains):
-    fetcher = AhrefsFetcher()
-    results = await fetcher.fetch_all(domains)
-
-    for i, domain in enumerate(domains):
-        if i < len(results):
-            results[i]['domain'] = domain
-
-    return results
+def get_lookup(lookup_id):
+    fail_stale_lookups()
+    try:
+        return AhrefsLookup.objects.get(pk=lookup_id)
+    except (AhrefsLookup.DoesNotExist, ValidationError):
+        raise Http404("Lookup not found")
 
 
 def ahrefs_test_view(request):
-    results = None
+    """Queues a bulk lookup and shows its progress, then its results."""
     form = AhrefsForm()
     api_balance = check_api_limit()
-    all_fields = []
+    request.session.pop("ahrefs_results", None)  # results were kept in the session before
 
     if request.method == "POST":
         form = AhrefsForm(request.POST)
         if form.is_valid():
-            domain_list = form.cleaned_data["domains"].splitlines()
-            domain_list = [d.strip() for d in domain_list if d.strip()]
+            domain_list = [d.strip() for d in form.cleaned_data["domains"].splitlines() if d.strip()]
+            domain_list = list(dict.fromkeys(domain_list))
+            units_left = rows_left(api_balance)
 
-            if domain_list:
-                results = asyncio.run(fetch_ahrefs_bulk(domain_list))
-                request.session["ahrefs_results"] = results
+            if units_left is not None and len(domain_list) * UNITS_PER_DOMAIN > units_left:
+                form.add_error("domains", f"{len(domain_list)} domains need up to {len(domain_list) * UNITS_PER_DOMAIN} "
+                                          f"Ahrefs units, only {units_left} left.")
+            elif domain_list:
+                lookup = start_lookup(domain_list)
+                return redirect(f"{reverse('ahrefs_test')}?lookup={lookup.pk}")
 
-                all_fields = list({key for data in results if data for key in data.keys()})
+    lookup = get_lookup(request.GET["lookup"]) if request.GET.get("lookup") else None
+    results = lookup_rows(lookup) if lookup and lookup.status == "done" else None
 
     return render(request, "ahrefs_test.html", {
         "form": form,
+        "lookup": lookup,
         "results": results,
         "api_balance": api_balance,
-        "fields": all_fields
+        "fields": lookup_fields(results) if results else [],
     })
 
 
+def ahrefs_lookup_progress(request, lookup_id):
+    lookup = get_lookup(lookup_id)
+    return JsonResponse({
+        "status": lookup.status,
+        "done": lookup.done,
+        "total": lookup.total,
+        "error": lookup.error,
+    })
+
 
-def download_ahrefs_data(request, file_type):
-    results = request.session.get("ahrefs_results", [])
+def download_ahrefs_data(request, lookup_id, file_type):
+    lookup = get_lookup(lookup_id)
+    results = lookup_rows(lookup)
 
     if not results:
         return HttpResponse("No data available to download.", content_type="text/plain")
 
     if file_type == "csv":
         response = HttpResponse(content_type="text/csv")
-        response["Content-Disposition"] = 'attachment; filename="ahrefs_data.csv"'
+        response["Content-Disposition"] = f'attachment; filename="ahrefs_data_{lookup.pk}.csv"'
 
         writer = csv.writer(response)
         writer.writerow(["Domain", "Domain Rating", "Ahrefs Top", "Backlinks", "Ref Pages",
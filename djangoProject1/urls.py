@@ -16,22 +16,26 @@ Including another URLconf
 """
 from django.contrib import admin
 
-from autobidder_app.views import run_voodoo_parser, ahrefs_data_view, claim_bet, log_list_view, download_ahrefs_data
+from autobidder_app.views import run_voodoo_parser, ahrefs_data_view, ahrefs_data_api, claim_bet, log_list_view, download_ahrefs_data
+from autobidder_app.views import export_ahrefs_data
 from django.urls import path
 from debug_toolbar.toolbar import debug_toolbar_urls
-from autobidder_app.views import all_bets_view, update_max_bet, delete_bet, ahrefs_test_view
+from autobidder_app.views import all_bets_view, update_max_bet, delete_bet, ahrefs_test_view, ahrefs_lookup_progress
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('run-parser/', run_voodoo_parser, name='run_voodoo_parser'),
     path("", ahrefs_data_view, name="ahrefs_data"),
+    path("api/ahrefs-data/", ahrefs_data_api, name="ahrefs_data_api"),
+    path("export/ahrefs-data/<str:file_type>/", export_ahrefs_data, name="export_ahrefs_data"),
     path("claim_bet/", claim_bet, name="claim_bet"),
     path('all-bets/', all_bets_view, name='all_bets'),
     path('update-max-bet/<int:bet_id>/', update_max_bet, name='update_max_bet'),
     path('delete-bet/<int:bet_id>/', delete_bet, name='delete_bet'),
     path('logs/', log_list_view, name='log_list'),
                   path("ahrefs-test/", ahrefs_test_view, name="ahrefs_test"),
-                  path("download-ahrefs/<str:file_type>/", download_ahrefs_data, name="download_ahrefs"),
+                  path("ahrefs-test/<uuid:lookup_id>/progress/", ahrefs_lookup_progress, name="ahrefs_lookup_progress"),
+                  path("download-ahrefs/<uuid:lookup_id>/<str:file_type>/", download_ahrefs_data, name="download_ahrefs"),
 
  ] + debug_toolbar_urls()
 